@@ -0,0 +1 @@
+"""Benchmarks de desempenho do otimizador de slides (ver `run.py`); não fazem parte do pacote instalado."""
@@ -0,0 +1,329 @@
+"""
+Benchmarks dos caminhos críticos: rasterização (pdf_to_images), miniaturas,
+preview do layout e exportação raster (create_optimized_pdf_with_groups).
+
+Uso:
+    python -m benchmarks                      # perfil rápido, compara com a baseline
+    python -m benchmarks --profile full       # 10 a 2.000 páginas, todos os grids e DPIs
+    python -m benchmarks --save-baseline      # grava os resultados como nova baseline
+    python -m benchmarks --require-baseline   # falha (código 3) se não houver baseline
+    python -m benchmarks --stages export --kinds image --pages 100
+
+Cada caso roda em um processo novo, para que o pico de memória (RSS) medido seja
+só dele. Os PDFs sintéticos (ver `synthetic.py`) ficam em `--workdir` e são
+reaproveitados entre execuções. A comparação com a baseline usa a vazão
+(páginas/s); uma queda maior que `--tolerance` conta como regressão e faz o
+comando sair com código 1.
+
+A baseline (`benchmarks/baseline.json`) não vem no repositório, porque os números
+só valem para a máquina e a versão do poppler em que foram medidos: grave uma
+com `--save-baseline` (`make bench-baseline`) antes de mudar o código e compare
+depois com `make bench`, que exige a baseline.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from multiprocessing import get_context
+from pathlib import Path
+
+from slideoptimizer.config import get_default_config
+from slideoptimizer.export import create_optimized_pdf_with_groups
+from slideoptimizer.pages import LazyPdfPages, pdf_to_images
+from slideoptimizer.poppler import discover_poppler
+from slideoptimizer.preview import create_layout_preview
+
+from .synthetic import KINDS, ensure_pdf
+
+DEFAULT_BASELINE = Path(__file__).with_name('baseline.json')
+STAGES = ('ingest', 'thumbnails', 'preview', 'export')
+
+# Matriz de cada perfil: número de páginas dos PDFs, DPIs de rasterização e grids (colunas, linhas)
+PROFILES = {
+    'quick': {'pages': (10, 100), 'dpis': (150,), 'grids': ((2, 2), (3, 3))},
+    'full': {'pages': (10, 200, 2000), 'dpis': (100, 150, 200), 'grids': ((1, 1), (2, 2), (3, 3), (4, 4))},
+}
+
+# Previews do layout renderizados por caso (alternando frente e verso)
+PREVIEW_ITERATIONS = 200
+
+# Páginas por chamada do pdf_to_images, como na ingestão em blocos do aplicativo
+INGEST_CHUNK = 20
+
+
+@dataclass(frozen=True)
+class Case:
+    """Um ponto da matriz de benchmarks; `pages` é o número de páginas processadas."""
+    stage: str
+    kind: str = ''
+    pages: int = 0
+    dpi: int = 0
+    grid: tuple = ()
+    
+    @property
+    def case_id(self):
+        parts = [self.stage]
+        if self.kind:
+            parts.append(f'{self.kind}-{self.pages}p')
+        if self.dpi:
+            parts.append(f'{self.dpi}dpi')
+        if self.grid:
+            parts.append('{}x{}'.format(*self.grid))
+        return '/'.join(parts)
+
+
+def build_cases(profile, stages=STAGES, kinds=KINDS, pages=None):
+    """Lista os casos do perfil, na ordem de execução."""
+    matrix = PROFILES[profile]
+    page_counts = pages or matrix['pages']
+    cases = []
+    for stage in stages:
+        if stage == 'preview':
+            cases += [Case('preview', grid=grid) for grid in matrix['grids']]
+            continue
+        for kind in kinds:
+            for count in page_counts:
+                if stage == 'ingest':
+                    cases += [Case('ingest', kind, count, dpi) for dpi in matrix['dpis']]
+                elif stage == 'thumbnails':
+                    cases.append(Case('thumbnails', kind, count))
+                elif stage == 'export':
+                    cases += [Case('export', kind, count, dpi, grid)
+                              for dpi in matrix['dpis'] for grid in matrix['grids']]
+    return cases
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo atual em MB (None onde `resource` não existe, ex.: Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # O Linux informa em KiB; o macOS, em bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def grid_config(grid):
+    cols, rows = grid
+    return {**get_default_config(), 'grid_cols': cols, 'grid_rows': rows, 'show_borders': True,
+            'show_numbers': True}
+
+
+# Um estágio por função: recebem o caso (e o PDF) e retornam o tamanho da saída em bytes
+def bench_ingest(case, pdf_path, options):
+    for first in range(1, case.pages + 1, INGEST_CHUNK):
+        last = min(first + INGEST_CHUNK - 1, case.pages)
+        images = pdf_to_images(pdf_path, dpi=case.dpi, first_page=first, last_page=last)
+        if images is None:
+            raise RuntimeError("o poppler não conseguiu rasterizar o PDF")
+    return 0
+
+
+def bench_thumbnails(case, pdf_path, options):
+    source = LazyPdfPages(pdf_path, render_format=options['render_format'])
+    thumbnails = source.get_thumbnails(range(case.pages))
+    return sum(len(data) for data in thumbnails.values())
+
+
+def bench_preview(case, pdf_path, options):
+    config = grid_config(case.grid)
+    output_bytes = 0
+    for i in range(PREVIEW_ITERATIONS):
+        img = create_layout_preview(config, case.grid[0] * case.grid[1], page_number=i + 1,
+                                    landscape_binder_mode=True)
+        # O Streamlit envia o preview ao navegador como PNG
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        output_bytes += buffer.tell()
+    return output_bytes
+
+
+def bench_export(case, pdf_path, options):
+    source = LazyPdfPages(pdf_path, dpi=case.dpi, render_format=options['render_format'])
+    groups = [{'name': 'Benchmark', 'pages': [(0, i) for i in range(case.pages)], 'config': grid_config(case.grid)}]
+    fd, output_path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        create_optimized_pdf_with_groups(groups, {0: source}, output_path, workers=options['workers'],
+                                         memory_limit_mb=options['memory_limit_mb'])
+        return os.path.getsize(output_path)
+    finally:
+        os.remove(output_path)
+
+
+BENCHMARKS = {
+    'ingest': bench_ingest,
+    'thumbnails': bench_thumbnails,
+    'preview': bench_preview,
+    'export': bench_export,
+}
+
+
+def run_case(case, pdf_path, options):
+    """Executa um caso (em um processo próprio) e retorna as métricas."""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    output_bytes = BENCHMARKS[case.stage](case, pdf_path, options)
+    seconds = time.perf_counter() - wall_start
+    processed = PREVIEW_ITERATIONS if case.stage == 'preview' else case.pages
+    return {
+        'seconds': seconds,
+        # Só o processo Python: o tempo de CPU do poppler (subprocessos) não entra
+        'cpu_seconds': time.process_time() - cpu_start,
+        'pages': processed,
+        'pages_per_s': processed / seconds if seconds else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': output_bytes,
+    }
+
+
+def run_isolated(case, pdf_path, options, repeat=1):
+    """Roda o caso `repeat` vezes, cada uma em um processo novo, e fica com a mais rápida."""
+    best = None
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            result = executor.submit(run_case, case, pdf_path, options).result()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def machine_info():
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'poppler': discover_poppler().version,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Compara a vazão com a baseline; retorna {case_id: razão atual/baseline} e as regressões."""
+    ratios = {}
+    regressions = []
+    for case_id, result in results.items():
+        reference = baseline.get('results', {}).get(case_id)
+        if not reference or not reference.get('pages_per_s'):
+            continue
+        ratios[case_id] = result['pages_per_s'] / reference['pages_per_s']
+        if ratios[case_id] < 1 - tolerance:
+            regressions.append(case_id)
+    return ratios, regressions
+
+
+def format_row(case_id, result, ratio=None):
+    rss = f"{result['peak_rss_mb']:8.0f}" if result['peak_rss_mb'] is not None else f"{'-':>8}"
+    vs = f"{ratio:7.2f}x" if ratio is not None else f"{'-':>8}"
+    return (f"{case_id:<38} {result['pages']:>6} {result['seconds']:8.2f} {result['pages_per_s']:9.1f} "
+            f"{rss} {result['output_bytes'] / 1024:10.0f} {vs}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Benchmarks de ingestão, preview e exportação com PDFs sintéticos.")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick',
+                        help="tamanho da matriz de casos (padrão: quick)")
+    parser.add_argument('--stages', default=','.join(STAGES), help="estágios separados por vírgula")
+    parser.add_argument('--kinds', default=','.join(KINDS), help="tipos de PDF sintético separados por vírgula")
+    parser.add_argument('--pages', default=None, help="números de páginas (ex.: 10,500), no lugar dos do perfil")
+    parser.add_argument('--repeat', type=int, default=1, help="execuções por caso; vale a mais rápida")
+    parser.add_argument('--workers', type=int, default=None, help="threads de preparação na exportação")
+    parser.add_argument('--memory-limit', type=int, default=256, metavar='MB',
+                        help="limite de memória das imagens por janela na exportação, para que os casos "
+                             "grandes do perfil full (2.000 páginas a 200 dpi) caibam na máquina "
+                             "(padrão: 256; 0 = janelas padrão de poucas folhas)")
+    parser.add_argument('--render-format', choices=['ppm', 'jpeg'], default=None,
+                        help="renderiza as páginas em arquivos (como a opção do aplicativo)")
+    parser.add_argument('--workdir', default=None,
+                        help="pasta dos PDFs sintéticos, mantida entre execuções (padrão: temporária)")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="JSON da baseline")
+    parser.add_argument('--save-baseline', action='store_true', help="grava os resultados como baseline")
+    parser.add_argument('--require-baseline', action='store_true',
+                        help="sai com código 3 se não houver baseline para comparar")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="queda de vazão tolerada antes de contar regressão (padrão: 0.15)")
+    parser.add_argument('--json', default=None, help="grava também os resultados neste arquivo")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stages = [stage for stage in args.stages.split(',') if stage]
+    kinds = [kind for kind in args.kinds.split(',') if kind]
+    unknown = set(stages) - set(STAGES) | set(kinds) - set(KINDS)
+    if unknown:
+        print(f"opções desconhecidas: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    pages = tuple(int(count) for count in args.pages.split(',')) if args.pages else None
+    if args.require_baseline and not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"sem baseline em {args.baseline}: nada a comparar. Grave uma antes de mudar o código "
+              f"com --save-baseline (make bench-baseline)", file=sys.stderr)
+        return 3
+    
+    machine = machine_info()
+    if not discover_poppler().found and set(stages) - {'preview'}:
+        print("poppler não encontrado: rodando só o estágio 'preview'", file=sys.stderr)
+        stages = [stage for stage in stages if stage == 'preview']
+    
+    options = {'render_format': args.render_format, 'workers': args.workers,
+               'memory_limit_mb': args.memory_limit or None}
+    workdir = args.workdir or tempfile.mkdtemp(prefix='slideopt-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != machine:
+            print("aviso: a baseline foi gravada em outro ambiente; compare com cautela", file=sys.stderr)
+    
+    print(f"{'caso':<38} {'págs':>6} {'s':>8} {'págs/s':>9} {'RSS MB':>8} {'saída KB':>10} {'vs base':>8}")
+    results = {}
+    try:
+        for case in build_cases(args.profile, stages, kinds, pages):
+            pdf_path = ensure_pdf(workdir, case.kind, case.pages) if case.kind else None
+            result = run_isolated(case, pdf_path, options, args.repeat)
+            results[case.case_id] = {**asdict(case), **result}
+            ratio = compare({case.case_id: result}, baseline, args.tolerance)[0].get(case.case_id)
+            print(format_row(case.case_id, result, ratio), flush=True)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    report = {'machine': machine, 'profile': args.profile, 'options': options, 'results': results}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    
+    if args.save_baseline:
+        # Mantém os casos da baseline anterior que não rodaram agora
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                previous = json.load(f)
+            if previous.get('machine') == machine:
+                report['results'] = {**previous.get('results', {}), **results}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline gravada em {args.baseline}")
+        return 0
+    
+    if not baseline:
+        print(f"aviso: sem baseline em {args.baseline}, nada foi comparado; grave uma com --save-baseline",
+              file=sys.stderr)
+        return 0
+    
+    _, regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regressão(ões) acima de {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("sem regressões em relação à baseline")
+    return 0
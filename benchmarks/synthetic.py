@@ -0,0 +1,101 @@
+"""
+PDFs sintéticos para os benchmarks, gerados só com ReportLab e Pillow.
+
+Os arquivos são determinísticos (mesmo tipo, número de páginas e semente geram os
+mesmos bytes de conteúdo), e cada página tem um texto próprio, para que a
+deduplicação de páginas idênticas não distorça as medições.
+"""
+
+import io
+import os
+import random
+
+from PIL import Image
+from reportlab.lib.pagesizes import A4, landscape, letter, portrait
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+# Tipos de PDF sintético (ver make_pdf)
+KINDS = ('text', 'image', 'mixed')
+
+# Slide 16:9 (como os exportados pelo PowerPoint/Google Slides), em pontos
+SLIDE_SIZE = (960, 540)
+
+# Tamanhos alternados pelo gerador 'mixed': slide 16:9, A4 retrato, carta paisagem e slide 4:3
+MIXED_SIZES = (SLIDE_SIZE, portrait(A4), landscape(letter), (720, 540))
+
+# Fotos distintas usadas pelos geradores com imagens (repetidas em ciclo entre as páginas)
+PHOTO_POOL_SIZE = 12
+
+WORDS = ('análise', 'processo', 'resultado', 'modelo', 'sistema', 'dados', 'estrutura', 'função',
+         'método', 'exemplo', 'variável', 'conceito', 'aplicação', 'relação', 'definição', 'teorema')
+
+
+def _sentence(rng, words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _photo(rng, size=(640, 360)):
+    """Imagem suave e colorida (ruído de baixa resolução ampliado), parecida com uma foto em JPEG."""
+    small = (size[0] // 8, size[1] // 8)
+    channels = [Image.frombytes('L', small, rng.randbytes(small[0] * small[1])) for _ in range(3)]
+    img = Image.merge('RGB', channels).resize(size, Image.Resampling.BICUBIC)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=85)
+    buffer.seek(0)
+    return ImageReader(buffer)
+
+
+def _draw_text_page(c, width, height, page_idx, rng):
+    c.setFont('Helvetica-Bold', height * 0.06)
+    c.drawString(width * 0.06, height * 0.85, f"{page_idx + 1}. {_sentence(rng, 4)}")
+    c.setFont('Helvetica', height * 0.035)
+    y = height * 0.72
+    for _ in range(8):
+        c.drawString(width * 0.08, y, f"• {_sentence(rng)}")
+        y -= height * 0.075
+    c.setStrokeColorRGB(0.2, 0.4, 0.7)
+    c.setLineWidth(3)
+    c.line(width * 0.06, height * 0.82, width * 0.94, height * 0.82)
+
+
+def _draw_image_page(c, width, height, page_idx, rng, photos):
+    photo = photos[page_idx % len(photos)]
+    c.drawImage(photo, width * 0.05, height * 0.15, width=width * 0.9, height=height * 0.75,
+                preserveAspectRatio=True)
+    c.setFont('Helvetica', height * 0.035)
+    c.drawString(width * 0.06, height * 0.07, f"Figura {page_idx + 1}: {_sentence(rng, 5)}")
+
+
+def make_pdf(path, kind, pages, seed=0):
+    """
+    Grava em `path` um PDF com `pages` páginas do tipo `kind`:
+    'text' (slides só com texto), 'image' (uma foto por página) ou
+    'mixed' (tamanhos de página variados, alternando texto e foto).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"tipo de PDF inválido: {kind!r}")
+    rng = random.Random(f'{kind}-{seed}')
+    photos = [_photo(rng) for _ in range(PHOTO_POOL_SIZE)] if kind != 'text' else []
+    
+    c = canvas.Canvas(path, pagesize=SLIDE_SIZE, invariant=1)
+    for page_idx in range(pages):
+        size = MIXED_SIZES[page_idx % len(MIXED_SIZES)] if kind == 'mixed' else SLIDE_SIZE
+        c.setPageSize(size)
+        if kind == 'text' or (kind == 'mixed' and page_idx % 2 == 0):
+            _draw_text_page(c, *size, page_idx, rng)
+        else:
+            _draw_image_page(c, *size, page_idx, rng, photos)
+        c.showPage()
+    c.save()
+    return path
+
+
+def ensure_pdf(directory, kind, pages, seed=0):
+    """Caminho do PDF sintético em `directory`, gerando-o só se ainda não existir."""
+    path = os.path.join(directory, f'{kind}-{pages}p-s{seed}.pdf')
+    if not os.path.exists(path):
+        make_pdf(path + '.tmp', kind, pages, seed)
+        os.replace(path + '.tmp', path)
+    return path
+
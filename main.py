@@ -1,21 +1,20 @@
 import streamlit as st
-import tempfile
 import os
-from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
-import io
-from pypdf import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, A3, letter, legal, landscape, portrait
-from reportlab.lib.utils import ImageReader
-from reportlab.lib.colors import Color, HexColor
-import pdf2image
 import subprocess
 import platform
-import math
-import copy
 from datetime import datetime
 import json
+import copy
+
+from slideoptimizer.config import PAGE_SIZES, TEMPLATES, ExportSettings, get_default_config
+from slideoptimizer.export import LayoutPlan, count_sheets
+from slideoptimizer.instrument import Instrumentation, activate
+from slideoptimizer.job import ExportJob
+from slideoptimizer.jobqueue import default_job_queue
+from slideoptimizer.pages import RenditionCache, default_page_disk_cache, default_worker_count, ingest_pdfs
+from slideoptimizer.poppler import discover_poppler, forget_poppler
+from slideoptimizer.preview import create_layout_preview, group_sheet_slides, sheet_preview_png
+from slideoptimizer.selection import PageOwnership, duplicate_pages, parse_page_ranges
 
 # Configuração da página do Streamlit
 st.set_page_config(
@@ -24,133 +23,29 @@ st.set_page_config(
     layout="wide"
 )
 
-# Dicionário de tamanhos de página
-PAGE_SIZES = {
-    "A4": A4,
-    "A3": A3,
-    "Carta (Letter)": letter,
-    "Ofício (Legal)": legal
-}
-
-# Templates predefinidos
-TEMPLATES = {
-    "Padrão (2x2)": {
-        'grid_cols': 2, 'grid_rows': 2,
-        'margin_left': 3.0, 'margin_right': 1.0,
-        'margin_top': 1.0, 'margin_bottom': 1.0,
-        'page_orientation': 'Paisagem'
-    },
-    "Econômico (3x3)": {
-        'grid_cols': 3, 'grid_rows': 3,
-        'margin_left': 1.0, 'margin_right': 0.5,
-        'margin_top': 0.5, 'margin_bottom': 0.5,
-        'page_orientation': 'Paisagem'
-    },
-    "Revisão Rápida (4x4)": {
-        'grid_cols': 4, 'grid_rows': 4,
-        'margin_left': 1.0, 'margin_right': 0.5,
-        'margin_top': 0.5, 'margin_bottom': 0.5,
-        'page_orientation': 'Paisagem',
-        'show_numbers': True,
-        'number_size': 8
-    },
-    "Anotações (1x2)": {
-        'grid_cols': 1, 'grid_rows': 2,
-        'margin_left': 5.0, 'margin_right': 3.0,
-        'margin_top': 2.0, 'margin_bottom': 2.0,
-        'page_orientation': 'Retrato',
-        'show_borders': True
-    },
-    "Apresentação (1x1)": {
-        'grid_cols': 1, 'grid_rows': 1,
-        'margin_left': 2.0, 'margin_right': 2.0,
-        'margin_top': 2.0, 'margin_bottom': 2.0,
-        'page_orientation': 'Paisagem'
-    },
-    "Handout (2x3)": {
-        'grid_cols': 2, 'grid_rows': 3,
-        'margin_left': 2.0, 'margin_right': 2.0,
-        'margin_top': 2.0, 'margin_bottom': 2.0,
-        'page_orientation': 'Retrato',
-        'spacing': 15
-    }
-}
+# Como as páginas renderizadas são guardadas (rótulo na interface -> `render_format`)
+RENDER_FORMATS = {'Memória': None, 'Arquivos PPM': 'ppm', 'Arquivos JPEG': 'jpeg'}
 
 # Função para verificar e instalar poppler se necessário
-def check_poppler():
-    """Verifica se o poppler está instalado e tenta instalar se necessário."""
-    # Lista de comandos do poppler para verificar
-    poppler_commands = ['pdfinfo', 'pdfimages', 'pdftoppm', 'pdftocairo']
-    
-    # Verifica primeiro se há um caminho customizado
+def check_poppler(refresh=False):
+    """
+    Verifica se o poppler está instalado (resultado em cache para todo o servidor).
+    Com `refresh=True` refaz a procura e, se preciso, tenta instalar o poppler.
+    """
     custom_path = st.session_state.get('poppler_path', None)
-    if custom_path and os.path.exists(custom_path):
-        for cmd in poppler_commands:
-            try:
-                full_cmd = os.path.join(custom_path, cmd)
-                if platform.system() == "Windows":
-                    full_cmd += ".exe"
-                
-                if os.path.exists(full_cmd):
-                    st.success(f"✅ Poppler encontrado no caminho customizado: {custom_path}")
-                    return True
-            except:
-                continue
-    
-    # Locais comuns onde o poppler pode estar instalado
-    common_paths = []
-    if platform.system() == "Windows":
-        common_paths = [
-            r"C:\Program Files\poppler\Library\bin",
-            r"C:\Program Files (x86)\poppler\Library\bin",
-            r"C:\poppler\Library\bin",
-            r"C:\msys64\mingw64\bin",
-            r"C:\tools\poppler\Library\bin"
-        ]
-    elif platform.system() == "Darwin":  # macOS
-        common_paths = [
-            "/usr/local/bin",
-            "/opt/homebrew/bin",
-            "/opt/local/bin",
-            "/usr/bin"
-        ]
-    else:  # Linux
-        common_paths = [
-            "/usr/bin",
-            "/usr/local/bin",
-            "/snap/bin"
-        ]
-    
-    # Primeiro tenta no PATH padrão
-    for cmd in poppler_commands:
-        try:
-            if platform.system() == "Windows":
-                result = subprocess.run([f'{cmd}.exe', '-v'], capture_output=True, text=True, shell=True)
-            else:
-                result = subprocess.run([cmd, '-v'], capture_output=True, text=True)
-            
-            if result.returncode == 0 or 'version' in result.stdout.lower() or 'version' in result.stderr.lower():
-                # Poppler está no PATH padrão - não precisa de mensagem extra
-                return True
-        except (FileNotFoundError, subprocess.SubprocessError):
-            continue
+    poppler = discover_poppler(custom_path, refresh=refresh)
+    found_path = poppler.path
     
-    # Tenta nos caminhos comuns
-    for path in common_paths:
-        for cmd in poppler_commands:
-            try:
-                full_cmd = os.path.join(path, cmd)
-                if platform.system() == "Windows":
-                    full_cmd += ".exe"
-                
-                if os.path.exists(full_cmd):
-                    result = subprocess.run([full_cmd, '-v'], capture_output=True, text=True)
-                    if result.returncode == 0 or 'version' in result.stdout.lower() or 'version' in result.stderr.lower():
-                        st.info(f"✅ Poppler encontrado em: {path}")
-                        st.session_state.poppler_path = path  # Salva o caminho automaticamente
-                        return True
-            except:
-                continue
+    if found_path is not None:
+        if found_path == '':
+            # Poppler está no PATH padrão - não precisa de mensagem extra
+            pass
+        elif found_path == custom_path:
+            st.success(f"✅ Poppler encontrado no caminho customizado: {custom_path}")
+        else:
+            st.info(f"✅ Poppler encontrado em: {found_path}")
+            st.session_state.poppler_path = found_path  # Salva o caminho automaticamente
+        return True
     
     # Se chegou aqui, poppler não está instalado ou não está no PATH
     st.warning("⚠️ Poppler não encontrado no sistema.")
@@ -170,6 +65,11 @@ def check_poppler():
         """)
         return False
     
+    # A instalação automática (lenta, pode pedir sudo) só roda a pedido do usuário
+    if not refresh:
+        st.info("Instale o Poppler pelo gerenciador de pacotes ou clique em \"Verificar novamente\" para tentar instalar automaticamente.")
+        return False
+    
     try:
         if system == "Darwin":  # macOS
             # Verifica se o homebrew está instalado
@@ -183,6 +83,7 @@ def check_poppler():
             result = subprocess.run(["brew", "install", "poppler"], capture_output=True, text=True)
             if result.returncode == 0:
                 st.success("✅ Poppler instalado com sucesso!")
+                forget_poppler()
                 return True
             else:
                 st.error("❌ Erro ao instalar Poppler via Homebrew")
@@ -197,6 +98,7 @@ def check_poppler():
                 result = subprocess.run(["sudo", "apt-get", "install", "-y", "poppler-utils"], capture_output=True)
                 if result.returncode == 0:
                     st.success("✅ Poppler instalado com sucesso!")
+                    forget_poppler()
                     return True
             
             # Se falhou, tenta com outras distros
@@ -214,471 +116,169 @@ def check_poppler():
         st.error(f"❌ Erro ao tentar instalar Poppler: {str(e)}")
         return False
 
-# Função para converter páginas PDF em imagens
-def pdf_to_images(pdf_path, dpi=150):
-    """Converte todas as páginas de um PDF em imagens."""
-    try:
-        # Configurações para pdf2image
-        kwargs = {
-            'dpi': dpi,
-            'fmt': 'png',
-            'thread_count': 4,
-            'use_pdftocairo': True
-        }
-        
-        # Se houver um caminho customizado do poppler, usa ele
-        poppler_path = st.session_state.get('poppler_path', None)
-        if poppler_path and os.path.exists(poppler_path):
-            kwargs['poppler_path'] = poppler_path
-        
-        # Tenta converter com as configurações
-        images = pdf2image.convert_from_path(pdf_path, **kwargs)
-        return images
-    except Exception as e:
-        # Tenta com configurações mais básicas se falhar
-        try:
-            kwargs_basic = {'dpi': dpi}
-            poppler_path = st.session_state.get('poppler_path', None)
-            if poppler_path and os.path.exists(poppler_path):
-                kwargs_basic['poppler_path'] = poppler_path
-                
-            images = pdf2image.convert_from_path(pdf_path, **kwargs_basic)
-            return images
-        except Exception as e2:
-            st.error(f"Erro ao converter PDF em imagens: {str(e2)}")
-            st.info("Verifique se o Poppler está instalado corretamente")
-            return None
+# Cache de miniaturas compartilhado por todas as sessões do servidor
+@st.cache_resource
+def get_rendition_cache():
+    return RenditionCache()
 
-# Função para criar configuração padrão
-def get_default_config():
-    return {
-        'page_size': 'A4',
-        'page_orientation': 'Paisagem',
-        'grid_cols': 2,
-        'grid_rows': 2,
-        'margin_left': 3.0,
-        'margin_right': 1.0,
-        'margin_top': 1.0,
-        'margin_bottom': 1.0,
-        'spacing': 20,
-        'show_borders': False,
-        'border_width': 0.5,
-        'show_numbers': False,
-        'number_size': 10,
-        'number_position': 'Inferior Esquerdo',
-        'image_quality': 'Alta',
-        'rotate_images': 0,
-        'image_orientation': 'Manter Original',
-        'fit_mode': 'Ajustar (manter visível)',
-        'watermark_text': '',
-        'watermark_size': 40,
-        'watermark_opacity': 0.1,
-        'header_text': '',
-        'footer_text': '',
-        'header_footer_size': 10
-    }
+# Cache de páginas em disco compartilhado por todas as sessões (e reinícios) do servidor
+@st.cache_resource
+def get_page_disk_cache():
+    return default_page_disk_cache()
 
-# Função para criar preview do layout
-def create_layout_preview(config, selected_count=4, page_number=1):
-    """Cria uma imagem de preview do layout baseado nas configurações."""
-    # Dimensões do preview (proporcionais ao papel real)
-    preview_width = 400
-    
-    # Calcula dimensões reais da página
-    page_size = PAGE_SIZES[config['page_size']]
-    if config['page_orientation'] == 'Paisagem':
-        real_width, real_height = landscape(page_size)
-    else:
-        real_width, real_height = portrait(page_size)
-    
-    # Calcula altura proporcional do preview
-    aspect_ratio = real_height / real_width
-    preview_height = int(preview_width * aspect_ratio)
-    
-    # Cria imagem do preview
-    img = Image.new('RGB', (preview_width, preview_height), 'white')
-    draw = ImageDraw.Draw(img)
-    
-    # Verifica se as margens devem ser invertidas
-    landscape_binder_mode = st.session_state.get('landscape_binder_mode', False)
-    invert_margins = landscape_binder_mode and (page_number % 2 == 0)
-    
-    # Calcula margens proporcionais
-    scale = preview_width / real_width
-    if invert_margins:
-        # Páginas pares: inverte apenas superior com inferior
-        margin_left = int(config['margin_left'] * scale * 28.35)
-        margin_right = int(config['margin_right'] * scale * 28.35)
-        margin_top = int(config['margin_bottom'] * scale * 28.35)  # Invertido!
-        margin_bottom = int(config['margin_top'] * scale * 28.35)  # Invertido!
-    else:
-        # Páginas ímpares: margens normais
-        margin_left = int(config['margin_left'] * scale * 28.35)
-        margin_right = int(config['margin_right'] * scale * 28.35)
-        margin_top = int(config['margin_top'] * scale * 28.35)
-        margin_bottom = int(config['margin_bottom'] * scale * 28.35)
-    
-    spacing = int(config['spacing'] * scale)
-    
-    # Área útil
-    usable_width = preview_width - margin_left - margin_right
-    usable_height = preview_height - margin_top - margin_bottom
-    
-    # Desenha fundo e área de margens
-    draw.rectangle([0, 0, preview_width, preview_height], fill='#f0f0f0')
-    draw.rectangle([margin_left, margin_top, preview_width - margin_right, preview_height - margin_bottom], fill='white')
-    
-    # Configurações do grid
-    cols = max(1, config['grid_cols'])  # Garante pelo menos 1
-    rows = max(1, config['grid_rows'])  # Garante pelo menos 1
-    
-    # Verifica se há espaço suficiente
-    if usable_width > 10 and usable_height > 10 and cols > 0 and rows > 0:
-        # Calcula tamanho de cada slide
-        slide_width = max(1, (usable_width - (cols - 1) * spacing) / cols)
-        slide_height = max(1, (usable_height - (rows - 1) * spacing) / rows)
-        
-        # Desenha marca d'água se configurada
-        if config.get('watermark_text', ''):
-            # Texto da marca d'água
-            watermark = config['watermark_text']
-            # Desenha no centro em cinza claro
-            text_x = preview_width // 2
-            text_y = preview_height // 2
-            draw.text((text_x, text_y), watermark, 
-                     fill=(220, 220, 220), anchor="mm")
-        
-        # Desenha cabeçalho se configurado
-        if config.get('header_text', ''):
-            draw.text((margin_left + 5, margin_top - 15), config['header_text'], 
-                     fill='#333333')
-        
-        # Desenha os slides
-        slide_num = 1
-        slides_per_page = cols * rows
-        for row in range(rows):
-            for col in range(cols):
-                if slide_num <= min(selected_count, slides_per_page):
-                    x = margin_left + col * (slide_width + spacing)
-                    y = margin_top + row * (slide_height + spacing)
-                    
-                    # Garante que as coordenadas são válidas
-                    x2 = min(x + slide_width, preview_width - margin_right)
-                    y2 = min(y + slide_height, preview_height - margin_bottom)
-                    
-                    # Desenha retângulo do slide
-                    if config['show_borders']:
-                        draw.rectangle([x, y, x2, y2], 
-                                     fill='white', outline='#666666', width=2)
-                    else:
-                        draw.rectangle([x, y, x2, y2], 
-                                     fill='white', outline='#e0e0e0', width=1)
-                    
-                    # Adiciona número do slide no centro
-                    text = f"{slide_num}"
-                    text_color = '#666666'
-                    
-                    # Posição central do texto
-                    text_x = x + slide_width / 2
-                    text_y = y + slide_height / 2
-                    
-                    # Desenha o número normalmente (sem rotação)
-                    draw.text((text_x, text_y), text, fill=text_color, anchor="mm")
-                
-                slide_num += 1
-        
-        # Desenha rodapé se configurado
-        if config.get('footer_text', ''):
-            draw.text((margin_left + 5, preview_height - margin_bottom + 5), 
-                     config['footer_text'], fill='#333333')
-        
-        # Indicador de margens invertidas se ativo
-        if invert_margins:
-            # Adiciona texto indicando inversão
-            draw.text((preview_width - 130, 10), "⇅ Margens sup/inf invertidas", fill='#ff6666')
-    else:
-        # Se não há espaço suficiente, mostra mensagem
-        msg = "Margens muito grandes\npara visualizar"
-        draw.multiline_text((preview_width // 2, preview_height // 2), 
-                           msg, fill='#ff0000', anchor="mm", align="center")
-    
-    # Linha tracejada na margem esquerda para fichário
-    if config['margin_left'] >= 2.5:  # Se margem >= 2.5cm
-        # Desenha furos de fichário
-        hole_y_positions = [
-            preview_height * 0.2,
-            preview_height * 0.5,
-            preview_height * 0.8
-        ]
-        hole_x = margin_left - 15
-        
-        for y_pos in hole_y_positions:
-            # Desenha círculo representando furo
-            draw.ellipse([hole_x - 5, y_pos - 5, hole_x + 5, y_pos + 5], 
-                        outline='#ff6666', width=2)
-    
-    return img
+# Índice de posse das páginas pelos grupos da sessão (refeito se a lista de grupos mudar)
+def get_page_ownership():
+    ownership = st.session_state.get('page_ownership')
+    if ownership is None or not ownership.tracks(st.session_state.groups):
+        ownership = PageOwnership(st.session_state.groups)
+        st.session_state.page_ownership = ownership
+    return ownership
 
-# Função para criar página em branco
-def create_blank_page_image(width=595, height=842):
-    """Cria uma imagem de página em branco."""
-    img = Image.new('RGB', (int(width), int(height)), 'white')
-    draw = ImageDraw.Draw(img)
-    
-    # Adiciona linhas pautadas opcionalmente
-    if st.session_state.get('blank_pages_lined', False):
-        line_spacing = 30
-        margin = 50
-        for y in range(margin + line_spacing, int(height) - margin, line_spacing):
-            draw.line([(margin, y), (int(width) - margin, y)], fill='#e0e0e0', width=1)
-    
-    return img
+# Páginas repetidas entre os PDFs carregados (recalculado só quando os PDFs mudam)
+def get_duplicate_pages():
+    sources = st.session_state.all_images
+    key = tuple(source.content_hash for source in sources.values())
+    cached = st.session_state.get('duplicate_pages')
+    if cached is None or cached[0] != key:
+        cached = (key, duplicate_pages(sources))
+        st.session_state.duplicate_pages = cached
+    return cached[1]
+
+# Descarta o estado dos checkboxes de páginas do grupo atual, para que reflitam a seleção
+# alterada pelos botões (sem isso o valor antigo do widget prevaleceria)
+def reset_page_checkboxes():
+    suffix = f"_group_{st.session_state.current_group}"
+    for key in [k for k in st.session_state.keys() if k.startswith('page_') and k.endswith(suffix)]:
+        del st.session_state[key]
+
+# Callback do "Ir para a página": abre a página da grade que contém a página do PDF
+def jump_to_page(pages_to_show, grid_page_size):
+    if st.session_state.jump_page is None:
+        return
+    target = st.session_state.jump_page - 1
+    for position, (_, page_idx) in enumerate(pages_to_show):
+        if page_idx == target:
+            st.session_state.grid_page = position // grid_page_size + 1
+            return
+
+# Fila de exportações compartilhada por todas as sessões do servidor
+@st.cache_resource
+def get_job_queue():
+    return default_job_queue()
+
+# Download diferido (arquivo lido só no clique) disponível a partir do Streamlit 1.52
+DEFERRED_DOWNLOADS = tuple(int(part) for part in st.__version__.split('.')[:2]) >= (1, 52)
 
-# Função para criar o PDF otimizado com grupos
-def create_optimized_pdf_with_groups(groups, all_images_dict, output_path):
+# Conteúdo de um arquivo do job desta sessão, lido uma vez só e reaproveitado entre reruns
+def read_job_file(output):
+    job_files = st.session_state.setdefault('job_files', {})
+    if output.path not in job_files:
+        job_files[output.path] = output.read()
+    return job_files[output.path]
+
+# Função para liberar os arquivos lidos quando o job da sessão é descartado ou expira
+def drop_job_files():
+    st.session_state.pop('job_files', None)
+
+# Função para obter os dados do botão de download de um arquivo gerado por um job
+def job_download_data(output):
     """
-    Cria um PDF com múltiplos slides por página baseado nos grupos e suas configurações.
+    O Streamlit carrega os dados do botão no armazenamento de mídia a cada rerun. Com
+    download diferido, o arquivo só é lido quando o usuário clica; nas versões
+    anteriores, é lido uma vez por job e guardado na sessão até o job ser descartado.
     """
-    # Configurações globais
-    global_watermark = st.session_state.get('global_watermark', '')
-    global_page_numbers = st.session_state.get('global_page_numbers', False)
-    landscape_binder_mode = st.session_state.get('landscape_binder_mode', False)
-    
-    # Cria o canvas do PDF
-    first_group = groups[0]
-    page_size = PAGE_SIZES[first_group['config']['page_size']]
+    if DEFERRED_DOWNLOADS:
+        return output.read
+    return read_job_file(output)
+
+# Andamento de uma exportação em segundo plano (atualizado a cada segundo, sem rerun da página)
+@st.fragment(run_every=1.0)
+def show_export_progress(job_id):
+    status = get_job_queue().status(job_id)
+    if status is None or status.finished:
+        st.rerun()
     
-    if first_group['config']['page_orientation'] == 'Paisagem':
-        c = canvas.Canvas(output_path, pagesize=landscape(page_size))
+    if status.state == 'queued':
+        st.info(f"⏳ Exportação na fila ({status.position} à frente)...")
     else:
-        c = canvas.Canvas(output_path, pagesize=portrait(page_size))
+        st.progress(status.fraction, text=f"Gerando PDF otimizado: folha {status.done} de {status.total}...")
     
-    first_page = True
-    global_page_num = 1
+    if st.button("⏹️ Cancelar exportação"):
+        get_job_queue().cancel(job_id)
+
+# Função para mostrar o estado e o resultado de uma exportação
+def show_export_job(job_id):
+    status = get_job_queue().status(job_id)
+    if status is None:
+        del st.session_state.export_job_id
+        drop_job_files()
+        return
     
-    # Processa cada grupo
-    for group_idx, group in enumerate(groups):
-        config = group['config']
-        selected_pages = group['pages']  # Lista de tuplas (pdf_index, page_index)
-        
-        if not selected_pages:
-            continue
-        
-        # Obtém as imagens selecionadas para este grupo
-        selected_images = []
-        for pdf_idx, page_idx in selected_pages:
-            if pdf_idx == -1:  # Página em branco
-                selected_images.append(create_blank_page_image())
-            else:
-                selected_images.append(all_images_dict[pdf_idx][page_idx])
-        
-        # Configurações do grupo
-        page_size = PAGE_SIZES[config['page_size']]
-        
-        if config['page_orientation'] == 'Paisagem':
-            page_width, page_height = landscape(page_size)
-        else:
-            page_width, page_height = portrait(page_size)
-        
-        # Margens originais
-        margin_left_original = config['margin_left'] * 28.35
-        margin_right_original = config['margin_right'] * 28.35
-        margin_top_original = config['margin_top'] * 28.35
-        margin_bottom_original = config['margin_bottom'] * 28.35
-        spacing = config['spacing']
+    if not status.finished:
+        show_export_progress(job_id)
+    elif status.state == 'done':
+        st.success(st.session_state.get('export_job_msg', "✅ PDF otimizado gerado com sucesso!"))
         
-        cols = config['grid_cols']
-        rows = config['grid_rows']
-        slides_per_page = cols * rows
-        
-        # Processa as imagens do grupo
-        for page_idx in range(0, len(selected_images), slides_per_page):
-            if not first_page:
-                c.showPage()
-                global_page_num += 1
-                if config['page_orientation'] == 'Paisagem':
-                    c.setPageSize(landscape(page_size))
-                else:
-                    c.setPageSize(portrait(page_size))
-            else:
-                first_page = False
-            
-            # Verifica se deve inverter as margens (modo fichário paisagem)
-            if landscape_binder_mode and (global_page_num % 2 == 0):
-                # Páginas pares: inverte apenas as margens superior/inferior
-                margin_top = margin_bottom_original
-                margin_bottom = margin_top_original
-                margin_left = margin_left_original
-                margin_right = margin_right_original
-            else:
-                # Páginas ímpares: margens normais
-                margin_top = margin_top_original
-                margin_bottom = margin_bottom_original
-                margin_left = margin_left_original
-                margin_right = margin_right_original
-            
-            # Recalcula as dimensões dos slides com as margens ajustadas
-            slide_width = (page_width - margin_left - margin_right - (cols - 1) * spacing) / cols
-            slide_height = (page_height - margin_top - margin_bottom - (rows - 1) * spacing) / rows
-            
-            # Adiciona marca d'água global ou do grupo
-            watermark = config.get('watermark_text', '') or global_watermark
-            if watermark:
-                c.saveState()
-                c.setFont("Helvetica", config.get('watermark_size', 40))
-                c.setFillColor(Color(0, 0, 0, alpha=config.get('watermark_opacity', 0.1)))
-                c.translate(page_width/2, page_height/2)
-                c.rotate(45)
-                c.drawCentredString(0, 0, watermark)
-                c.restoreState()
-            
-            # Adiciona cabeçalho
-            if config.get('header_text'):
-                c.setFont("Helvetica", config.get('header_footer_size', 10))
-                c.setFillColorRGB(0.2, 0.2, 0.2)
-                header = config['header_text'].replace('{page}', str(global_page_num))
-                header = header.replace('{date}', datetime.now().strftime('%d/%m/%Y'))
-                header = header.replace('{group}', group['name'])
-                c.drawString(margin_left, page_height - 20, header)
-            
-            # Adiciona rodapé
-            if config.get('footer_text'):
-                c.setFont("Helvetica", config.get('header_footer_size', 10))
-                c.setFillColorRGB(0.2, 0.2, 0.2)
-                footer = config['footer_text'].replace('{page}', str(global_page_num))
-                footer = footer.replace('{date}', datetime.now().strftime('%d/%m/%Y'))
-                footer = footer.replace('{group}', group['name'])
-                c.drawString(margin_left, 20, footer)
-            
-            # Adiciona numeração global de página
-            if global_page_numbers:
-                c.setFont("Helvetica", 10)
-                c.setFillColorRGB(0.5, 0.5, 0.5)
-                c.drawRightString(page_width - 20, 20, f"Página {global_page_num}")
-            
-            # Calcula posições dos slides no grid
-            positions = []
-            is_flipped_page = landscape_binder_mode and (global_page_num % 2 == 0)
+        # Download sem recarregar o PDF inteiro na memória a cada interação
+        timestamp = datetime.fromtimestamp(status.finished_at).strftime("%Y%m%d_%H%M%S")
+        st.download_button(
+            label=f"📥 Baixar PDF Otimizado ({status.output.size / 1024 / 1024:.1f} MB)",
+            data=job_download_data(status.output),
+            file_name=f"slides_otimizados_{timestamp}.pdf",
+            mime="application/pdf"
+        )
+    elif status.state == 'failed':
+        st.error(f"❌ Erro ao gerar o PDF: {status.error}")
+    else:
+        st.warning("⏹️ Exportação cancelada.")
 
-            for row in range(rows):
-                for col in range(cols):
-                    x = margin_left + col * (slide_width + spacing)
-                    
-                    if is_flipped_page:
-                        # Lógica para páginas PARES (verso): constrói de baixo para cima
-                        # Inverte a ordem das linhas para criar o efeito de espelho vertical
-                        y = margin_bottom + (rows - 1 - row) * slide_height + (rows - 1 - row) * spacing
-                    else:
-                        # Lógica para páginas ÍMPARES (frente): constrói de cima para baixo
-                        y = page_height - margin_top - (row + 1) * slide_height - row * spacing
-                    
-                    positions.append((x, y))
-            
-            # Adiciona slides na página atual
-            for j in range(slides_per_page):
-                if page_idx + j < len(selected_images):
-                    img = selected_images[page_idx + j]
-                    
-                    # Número da página original
-                    pdf_idx, orig_page_idx = selected_pages[page_idx + j]
-                    if pdf_idx >= 0:
-                        original_page_num = orig_page_idx + 1
-                    else:
-                        original_page_num = "Branco"
-                    
-                    if config['rotate_images'] != 0:
-                        img = img.rotate(-config['rotate_images'], expand=True)
-                    
-                    img_buffer = io.BytesIO()
-                    if config['image_quality'] == 'Alta':
-                        quality = 95
-                    elif config['image_quality'] == 'Média':
-                        quality = 85
-                    else:
-                        quality = 70
-                    
-                    img.save(img_buffer, format='PNG', optimize=True, quality=quality)
-                    img_buffer.seek(0)
-                    
-                    img_width, img_height = img.size
-                    aspect_ratio = img_width / img_height
-                    
-                    if config['image_orientation'] == 'Forçar Paisagem' and aspect_ratio < 1:
-                        img = img.rotate(90, expand=True)
-                        img_buffer = io.BytesIO()
-                        img.save(img_buffer, format='PNG', optimize=True, quality=quality)
-                        img_buffer.seek(0)
-                        img_width, img_height = img_height, img_width
-                        aspect_ratio = img_width / img_height
-                    elif config['image_orientation'] == 'Forçar Retrato' and aspect_ratio > 1:
-                        img = img.rotate(90, expand=True)
-                        img_buffer = io.BytesIO()
-                        img.save(img_buffer, format='PNG', optimize=True, quality=quality)
-                        img_buffer.seek(0)
-                        img_width, img_height = img_height, img_width
-                        aspect_ratio = img_width / img_height
-                    
-                    if config['fit_mode'] == 'Preencher (pode cortar)':
-                        if aspect_ratio > slide_width / slide_height:
-                            draw_height = slide_height
-                            draw_width = slide_height * aspect_ratio
-                        else:
-                            draw_width = slide_width
-                            draw_height = slide_width / aspect_ratio
-                    else:
-                        if aspect_ratio > slide_width / slide_height:
-                            draw_width = slide_width
-                            draw_height = slide_width / aspect_ratio
-                        else:
-                            draw_height = slide_height
-                            draw_width = slide_height * aspect_ratio
-                    
-                    x_offset = (slide_width - draw_width) / 2
-                    y_offset = (slide_height - draw_height) / 2
-                    
-                    x_base, y_base = positions[j]
-                    
-                    x_final = x_base + x_offset
-                    y_final = y_base + y_offset
-                    
-                    if config['show_borders']:
-                        c.setStrokeColorRGB(0.5, 0.5, 0.5)
-                        c.setLineWidth(config['border_width'])
-                        c.rect(x_base, y_base, slide_width, slide_height)
-                    
-                    c.drawImage(
-                        ImageReader(img_buffer),
-                        x_final,
-                        y_final,
-                        width=draw_width,
-                        height=draw_height,
-                        preserveAspectRatio=True,
-                        mask='auto'
-                    )
-                    
-                    if config['show_numbers'] and pdf_idx >= 0:
-                        c.setFont("Helvetica", config['number_size'])
-                        c.setFillColorRGB(0.3, 0.3, 0.3)
-                        
-                        # Mostra nome do PDF se houver múltiplos
-                        if len(st.session_state.get('pdf_files', [])) > 1:
-                            pdf_name = st.session_state['pdf_names'][pdf_idx]
-                            number_text = f"{pdf_name[:10]}... p{original_page_num}"
-                        else:
-                            number_text = f"{original_page_num}"
-                        
-                        if config['number_position'] == 'Superior Esquerdo':
-                            c.drawString(x_base + 5, y_base + slide_height - config['number_size'] - 5, number_text)
-                        elif config['number_position'] == 'Superior Direito':
-                            c.drawString(x_base + slide_width - 20, y_base + slide_height - config['number_size'] - 5, number_text)
-                        elif config['number_position'] == 'Inferior Esquerdo':
-                            c.drawString(x_base + 5, y_base + 5, number_text)
-                        elif config['number_position'] == 'Inferior Direito':
-                            c.drawString(x_base + slide_width - 20, y_base + 5, number_text)
-                        else:
-                            c.drawString(x_base + slide_width/2 - 10, y_base + slide_height/2, number_text)
+# Função para mostrar o painel de diagnósticos da importação e da exportação
+def show_diagnostics():
+    status = get_job_queue().status(st.session_state.export_job_id) if st.session_state.get('export_job_id') else None
+    sections = [("Importação", st.session_state.get('ingest_stats')), ("Exportação", status.stats if status else None)]
+    sections = [(title, stats) for title, stats in sections if stats]
+    if not sections:
+        return
     
-    c.save()
+    with st.expander("🩺 Diagnósticos", expanded=False):
+        for title, stats in sections:
+            st.markdown(f"**{title}**: {stats['wall']:.2f} s no total, {stats['cpu']:.2f} s de CPU")
+            st.table([
+                {
+                    'Etapa': name,
+                    'Chamadas': stage['calls'],
+                    'Tempo (s)': round(stage['wall'], 3),
+                    'CPU (s)': round(stage['cpu'], 3),
+                    'Páginas': stage['pages'],
+                    'MB': round(stage['bytes'] / 1024 ** 2, 2)
+                }
+                for name, stage in stats['stages'].items()
+            ])
+        st.caption("Nas etapas paralelas, o tempo soma todas as threads e pode passar do total.")
+        
+        st.download_button(
+            label="📄 Baixar diagnósticos (JSON)",
+            data=json.dumps({title: stats for title, stats in sections}, indent=2, ensure_ascii=False),
+            file_name="diagnosticos.json",
+            mime="application/json"
+        )
+        if status and status.finished and status.profile and status.profile.size:
+            st.download_button(
+                label="📊 Baixar perfil cProfile (.prof)",
+                data=job_download_data(status.profile),
+                file_name=f"exportacao_{status.job_id[:8]}.prof",
+                mime="application/octet-stream"
+            )
+
+# Função para reunir as configurações globais usadas na exportação
+def get_export_settings():
+    return ExportSettings(
+        global_watermark=st.session_state.get('global_watermark', ''),
+        global_page_numbers=st.session_state.get('global_page_numbers', False),
+        landscape_binder_mode=st.session_state.get('landscape_binder_mode', False),
+        blank_pages_lined=st.session_state.get('blank_pages_lined', False),
+        pdf_names=st.session_state.get('pdf_names', [])
+    )
 
 # Interface principal do Streamlit
 def main():
@@ -706,7 +306,7 @@ def main():
         """)
         # Botão para verificar novamente
         if st.button("🔄 Verificar novamente"):
-            st.session_state.poppler_ok = check_poppler()
+            st.session_state.poppler_ok = check_poppler(refresh=True)
             st.rerun()
     
     # Inicializa session_state
@@ -751,22 +351,55 @@ def main():
         
         if new_files:
             with st.spinner(f"Processando {len(new_files)} novo(s) PDF(s)..."):
-                for uploaded_file in new_files:
-                    # Salva o arquivo temporariamente
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                        tmp_file.write(uploaded_file.getvalue())
-                        tmp_path = tmp_file.name
+                # Uma barra de progresso por arquivo, atualizada conforme as miniaturas ficam prontas
+                progress_bars = [st.progress(0.0, text=f"{f.name}: abrindo...") for f in new_files]
+                
+                def show_progress(file_idx, done, total):
+                    progress_bars[file_idx].progress(
+                        done / total if total else 1.0,
+                        text=f"{new_files[file_idx].name}: {done}/{total} miniaturas"
+                    )
+                
+                # Com os diagnósticos ativados, mede as etapas da importação
+                instrumentation = None
+                if st.session_state.get('collect_diagnostics', False):
+                    instrumentation = Instrumentation('ingest', files=len(new_files))
+                
+                # Lê a contagem de páginas e gera em paralelo só as miniaturas da primeira
+                # página da grade; as demais e a resolução cheia são geradas sob demanda
+                with activate(instrumentation):
+                    results = ingest_pdfs(
+                        [f.getvalue() for f in new_files],
+                        dpi=st.session_state.get('pdf_dpi', 150),
+                        workers=st.session_state.get('parallel_workers', default_worker_count()),
+                        on_progress=show_progress,
+                        eager_thumbnails=st.session_state.get('grid_page_size', 48),
+                        rendition_cache=get_rendition_cache(),
+                        disk_cache=get_page_disk_cache(),
+                        poppler_path=st.session_state.get('poppler_path', None) or '',
+                        render_format=RENDER_FORMATS[st.session_state.get('render_format', 'Memória')],
+                        known_sources={source.content_hash: source for source in st.session_state.all_images.values()}
+                    )
+                if instrumentation:
+                    st.session_state.ingest_stats = instrumentation.to_dict()
+                
+                # Junta os resultados na ordem de upload
+                for uploaded_file, images, progress_bar in zip(new_files, results, progress_bars):
+                    progress_bar.empty()
+                    if isinstance(images, Exception):
+                        st.error(f"Erro ao abrir {uploaded_file.name}: {str(images)}")
+                        continue
                     
-                    # Converte em imagens
-                    dpi = st.session_state.get('pdf_dpi', 150)
-                    images = pdf_to_images(tmp_path, dpi=dpi)
-                    if images:
-                        pdf_idx = len(st.session_state.pdf_files)
-                        st.session_state.pdf_files.append(uploaded_file)
-                        st.session_state.pdf_names.append(uploaded_file.name)
-                        st.session_state.all_images[pdf_idx] = images
+                    # Arquivo idêntico a outro já carregado: reaproveita as páginas sem converter de novo
+                    same_content = [name for idx, name in enumerate(st.session_state.pdf_names)
+                                    if st.session_state.all_images[idx] is images]
+                    if same_content:
+                        st.info(f"ℹ️ {uploaded_file.name} tem o mesmo conteúdo de {same_content[0]}")
                     
-                    os.unlink(tmp_path)
+                    pdf_idx = len(st.session_state.pdf_files)
+                    st.session_state.pdf_files.append(uploaded_file)
+                    st.session_state.pdf_names.append(uploaded_file.name)
+                    st.session_state.all_images[pdf_idx] = images
         
         # Mostra PDFs carregados
         if st.session_state.pdf_files:
@@ -778,6 +411,13 @@ def main():
                 for idx, pdf_name in enumerate(st.session_state.pdf_names):
                     pages_count = len(st.session_state.all_images[idx])
                     st.write(f"**{idx+1}. {pdf_name}**: {pages_count} páginas")
+                
+                cache_stats = get_page_disk_cache().stats()
+                st.caption(
+                    f"💾 Cache de páginas em disco: {cache_stats['hits']} acertos, {cache_stats['misses']} falhas "
+                    f"({cache_stats['hit_rate']:.0%}) | {cache_stats['total_bytes'] / 1024 ** 2:.1f} de "
+                    f"{cache_stats['max_bytes'] / 1024 ** 2:.0f} MB"
+                )
             
             # Interface de grupos
             st.markdown("### 📁 Grupos de Páginas")
@@ -819,8 +459,7 @@ def main():
                         'pages': [],
                         'config': get_default_config()
                     }
-                    st.session_state.groups.append(new_group)
-                    st.session_state.current_group = len(st.session_state.groups) - 1
+                    st.session_state.current_group = get_page_ownership().add_group(new_group)
                     st.rerun()
             
             with col3:
@@ -831,8 +470,7 @@ def main():
                         'pages': current['pages'].copy(),
                         'config': current['config'].copy()
                     }
-                    st.session_state.groups.append(new_group)
-                    st.session_state.current_group = len(st.session_state.groups) - 1
+                    st.session_state.current_group = get_page_ownership().add_group(new_group)
                     st.rerun()
             
             with col4:
@@ -844,7 +482,7 @@ def main():
             with col5:
                 if len(st.session_state.groups) > 1:
                     if st.button("🗑️ Remover"):
-                        del st.session_state.groups[st.session_state.current_group]
+                        get_page_ownership().remove_group(st.session_state.current_group)
                         st.session_state.current_group = min(st.session_state.current_group, len(st.session_state.groups) - 1)
                         st.rerun()
             
@@ -1015,6 +653,25 @@ def main():
                                 key=f"image_quality_{st.session_state.current_group}"
                             )
                             
+                            image_formats = ['Automático', 'JPEG', 'PNG']
+                            config['image_format'] = st.selectbox(
+                                "Formato das Imagens",
+                                options=image_formats,
+                                index=image_formats.index(config.get('image_format', 'Automático')),
+                                help="Automático: PNG (sem perdas) para slides com poucas cores e JPEG para fotos",
+                                key=f"image_format_{st.session_state.current_group}"
+                            )
+                            
+                            print_dpi_options = [0, 100, 150, 200, 300]
+                            config['print_dpi'] = st.selectbox(
+                                "Resolução de Impressão",
+                                options=print_dpi_options,
+                                index=print_dpi_options.index(config.get('print_dpi', 0)),
+                                format_func=lambda x: "Original" if x == 0 else f"{x} DPI",
+                                help="Reduz cada imagem ao tamanho impresso da célula nesta resolução (arquivo menor, sem perda visível)",
+                                key=f"print_dpi_{st.session_state.current_group}"
+                            )
+                            
                             config['rotate_images'] = st.slider(
                                 "Rotação das Imagens (graus)",
                                 min_value=0,
@@ -1121,123 +778,158 @@ def main():
                         key="sort_mode",
                         help="PDF → Página: todos do PDF1, depois PDF2...\nIntercalar: página 1 de cada PDF, depois página 2..."
                     )
+                    duplicates = get_duplicate_pages()
+                    hide_duplicates = bool(duplicates) and st.checkbox(
+                        f"Ocultar páginas repetidas ({len(duplicates)})",
+                        key="hide_duplicates",
+                        help="Esconde as páginas com o mesmo conteúdo de uma página anterior (🔁 na grade)"
+                    )
                 
-                # Páginas já atribuídas a outros grupos
-                pages_in_other_groups = set()
-                for i, group in enumerate(st.session_state.groups):
-                    if i != st.session_state.current_group:
-                        pages_in_other_groups.update(group['pages'])
+                # Índice página -> grupo (consultas O(1) por página)
+                ownership = get_page_ownership()
+                group_idx = st.session_state.current_group
+                
+                if view_mode == 'Por PDF' and selected_pdf_idx is not None:
+                    scope_pages = [(selected_pdf_idx, i) for i in range(len(st.session_state.all_images[selected_pdf_idx]))]
+                else:
+                    scope_pages = [(pdf_idx, i) for pdf_idx, images in st.session_state.all_images.items()
+                                   for i in range(len(images))]
+                blank_pages = [p for p in current_group['pages'] if p[0] == -1]
                 
                 # Botões de seleção rápida
                 col1, col2, col3, col4, col5, col6 = st.columns(6)
                 with col1:
                     if st.button("✅ Todas", key="select_all"):
-                        if view_mode == 'Por PDF' and selected_pdf_idx is not None:
-                            pdf_pages = [(selected_pdf_idx, i) for i in range(len(st.session_state.all_images[selected_pdf_idx]))]
-                            current_group['pages'] = [p for p in pdf_pages if p not in pages_in_other_groups]
-                        else:
-                            all_pages = []
-                            for pdf_idx, images in st.session_state.all_images.items():
-                                all_pages.extend([(pdf_idx, i) for i in range(len(images))])
-                            current_group['pages'] = [p for p in all_pages if p not in pages_in_other_groups]
+                        ownership.set_pages(group_idx, ownership.available(scope_pages, group_idx))
+                        reset_page_checkboxes()
                 
                 with col2:
                     if st.button("❌ Nenhuma", key="select_none"):
-                        current_group['pages'] = [p for p in current_group['pages'] if p[0] == -1]  # Mantém apenas páginas em branco
+                        ownership.set_pages(group_idx, blank_pages)  # Mantém apenas páginas em branco
+                        reset_page_checkboxes()
                 
                 with col3:
                     if st.button("🔄 Inverter", key="invert"):
+                        inverted = [p for p in ownership.available(scope_pages, group_idx)
+                                    if not ownership.contains(group_idx, p)]
                         if view_mode == 'Por PDF' and selected_pdf_idx is not None:
-                            pdf_pages = [(selected_pdf_idx, i) for i in range(len(st.session_state.all_images[selected_pdf_idx]))]
-                            current_selected = set(p for p in current_group['pages'] if p[0] == selected_pdf_idx)
-                            inverted = [p for p in pdf_pages if p not in current_selected and p not in pages_in_other_groups]
                             other_pdfs = [p for p in current_group['pages'] if p[0] != selected_pdf_idx]
-                            current_group['pages'] = other_pdfs + inverted
+                            ownership.set_pages(group_idx, other_pdfs + inverted)
                         else:
-                            all_pages = []
-                            for pdf_idx, images in st.session_state.all_images.items():
-                                all_pages.extend([(pdf_idx, i) for i in range(len(images))])
-                            current_selected = set(p for p in current_group['pages'] if p[0] != -1)
-                            inverted = [p for p in all_pages if p not in current_selected and p not in pages_in_other_groups]
-                            blank_pages = [p for p in current_group['pages'] if p[0] == -1]
-                            current_group['pages'] = blank_pages + inverted
+                            ownership.set_pages(group_idx, blank_pages + inverted)
+                        reset_page_checkboxes()
                 
                 with col4:
                     if st.button("📊 Pares", key="even"):
-                        if view_mode == 'Por PDF' and selected_pdf_idx is not None:
-                            pdf_pages = [(selected_pdf_idx, i) for i in range(len(st.session_state.all_images[selected_pdf_idx])) if i % 2 == 1]
-                            current_group['pages'] = [p for p in pdf_pages if p not in pages_in_other_groups]
-                        else:
-                            all_pages = []
-                            for pdf_idx, images in st.session_state.all_images.items():
-                                all_pages.extend([(pdf_idx, i) for i in range(len(images)) if i % 2 == 1])
-                            current_group['pages'] = [p for p in all_pages if p not in pages_in_other_groups]
+                        ownership.set_pages(group_idx, ownership.available([p for p in scope_pages if p[1] % 2 == 1], group_idx))
+                        reset_page_checkboxes()
                 
                 with col5:
                     if st.button("🚫 Sem grupo", key="unassigned"):
-                        all_assigned = set()
-                        for group in st.session_state.groups:
-                            all_assigned.update(p for p in group['pages'] if p[0] != -1)
-                        
-                        unassigned = []
-                        for pdf_idx, images in st.session_state.all_images.items():
-                            unassigned.extend([(pdf_idx, i) for i in range(len(images)) 
-                                             if (pdf_idx, i) not in all_assigned])
-                        current_group['pages'] = unassigned
+                        all_pages = [(pdf_idx, i) for pdf_idx, images in st.session_state.all_images.items()
+                                     for i in range(len(images))]
+                        ownership.set_pages(group_idx, ownership.unassigned(all_pages))
+                        reset_page_checkboxes()
                 
                 with col6:
                     st.session_state.blank_pages_lined = st.checkbox("📝 Pautadas", value=False, help="Páginas em branco com linhas")
                 
+                # Seleção por intervalo, aplicada ao PDF exibido (ou a cada PDF em "Todas")
+                col_range, col_add, col_remove = st.columns([3, 1, 1])
+                with col_range:
+                    range_text = st.text_input(
+                        "Intervalo de páginas",
+                        key="range_text",
+                        placeholder="1-40, 55, 60-",
+                        help="Números e intervalos separados por vírgula; '60-' vai até a última página"
+                    )
+                with col_add:
+                    add_range = st.button("➕ Adicionar", key="range_add")
+                with col_remove:
+                    remove_range = st.button("➖ Remover", key="range_remove")
+                
+                if (add_range or remove_range) and range_text.strip():
+                    try:
+                        numbers = set(parse_page_ranges(range_text, max((p[1] for p in scope_pages), default=-1) + 1))
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        range_pages = [p for p in scope_pages if p[1] in numbers]
+                        if add_range:
+                            new_pages = [p for p in ownership.available(range_pages, group_idx)
+                                         if not ownership.contains(group_idx, p)]
+                            ownership.set_pages(group_idx, current_group['pages'] + new_pages)
+                        else:
+                            range_set = set(range_pages)
+                            ownership.set_pages(group_idx, [p for p in current_group['pages'] if p not in range_set])
+                        reset_page_checkboxes()
+                
                 # Grade de visualização
                 cols_per_row = 4
                 
                 # Determina quais imagens mostrar
                 if view_mode == 'Por PDF' and selected_pdf_idx is not None:
-                    images_to_show = [(selected_pdf_idx, i, st.session_state.all_images[selected_pdf_idx][i]) 
+                    pages_to_show = [(selected_pdf_idx, i) 
                                      for i in range(len(st.session_state.all_images[selected_pdf_idx]))]
                 else:
-                    images_to_show = []
+                    pages_to_show = []
                     if sort_mode == 'PDF → Página':
                         for pdf_idx, images in st.session_state.all_images.items():
-                            images_to_show.extend([(pdf_idx, i, images[i]) for i in range(len(images))])
+                            pages_to_show.extend([(pdf_idx, i) for i in range(len(images))])
                     else:  # Intercalar
                         max_pages = max(len(images) for images in st.session_state.all_images.values())
                         for page_num in range(max_pages):
                             for pdf_idx, images in st.session_state.all_images.items():
                                 if page_num < len(images):
-                                    images_to_show.append((pdf_idx, page_num, images[page_num]))
+                                    pages_to_show.append((pdf_idx, page_num))
+                
+                if hide_duplicates:
+                    pages_to_show = [p for p in pages_to_show if p not in duplicates]
                 
-                # Adiciona páginas em branco do grupo
-                blank_pages_in_group = [(idx, p) for idx, p in enumerate(current_group['pages']) if p[0] == -1]
+                # Paginação da grade: só as miniaturas da página atual viram widgets
+                col_size, col_page, col_jump = st.columns(3)
+                with col_size:
+                    grid_page_size = st.selectbox("Miniaturas por página", options=[24, 48, 96, 192], index=1,
+                                                  key="grid_page_size")
+                grid_pages = max(1, (len(pages_to_show) + grid_page_size - 1) // grid_page_size)
+                if st.session_state.get('grid_page', 1) > grid_pages:
+                    st.session_state.grid_page = grid_pages
+                with col_page:
+                    grid_page = st.number_input(f"Página da grade (de {grid_pages})", min_value=1, max_value=grid_pages,
+                                                step=1, key="grid_page")
+                with col_jump:
+                    st.number_input("Ir para a página do PDF", min_value=1, step=1, value=None, key="jump_page",
+                                    placeholder="nº da página", on_change=jump_to_page,
+                                    args=(pages_to_show, grid_page_size))
+                
+                visible_pages = pages_to_show[(grid_page - 1) * grid_page_size:grid_page * grid_page_size]
+                
+                # Gera (ou reaproveita) as miniaturas das páginas exibidas
+                thumbnails = {}
+                for pdf_idx in set(p[0] for p in visible_pages):
+                    indices = [page_idx for idx, page_idx in visible_pages if idx == pdf_idx]
+                    thumbnails[pdf_idx] = st.session_state.all_images[pdf_idx].get_thumbnails(indices)
                 
-                rows = (len(images_to_show) + cols_per_row - 1) // cols_per_row
+                rows = (len(visible_pages) + cols_per_row - 1) // cols_per_row
                 
-                selected_pages = []
+                checked = {}  # Estado dos checkboxes visíveis
                 
                 for row in range(rows):
                     cols = st.columns(cols_per_row)
                     for col_idx in range(cols_per_row):
                         idx = row * cols_per_row + col_idx
-                        if idx < len(images_to_show):
-                            pdf_idx, page_idx, img = images_to_show[idx]
+                        if idx < len(visible_pages):
+                            pdf_idx, page_idx = visible_pages[idx]
                             
                             with cols[col_idx]:
-                                # Redimensiona a imagem
-                                img_resized = img.copy()
-                                img_resized.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                                
-                                # Mostra a imagem
-                                st.image(img_resized, use_container_width=True)
+                                # Mostra a miniatura
+                                st.image(thumbnails[pdf_idx][page_idx], use_container_width=True)
                                 
                                 # Verifica se está em outro grupo
                                 page_tuple = (pdf_idx, page_idx)
-                                in_other_group = page_tuple in pages_in_other_groups
-                                other_group_name = ""
-                                if in_other_group:
-                                    for i, g in enumerate(st.session_state.groups):
-                                        if i != st.session_state.current_group and page_tuple in g['pages']:
-                                            other_group_name = g['name']
-                                            break
+                                other_group_idx = ownership.owner(page_tuple, exclude=group_idx)
+                                in_other_group = other_group_idx is not None
+                                other_group_name = st.session_state.groups[other_group_idx]['name'] if in_other_group else ""
                                 
                                 # Label
                                 if len(st.session_state.pdf_files) > 1:
@@ -1246,23 +938,31 @@ def main():
                                 else:
                                     label = f"Página {page_idx + 1}"
                                 
+                                if page_tuple in duplicates:
+                                    first_pdf, first_page = duplicates[page_tuple]
+                                    label += f" 🔁 p{first_page + 1}"
+                                    if first_pdf != pdf_idx:
+                                        label += f" de {st.session_state.pdf_names[first_pdf][:15]}"
+                                
                                 if in_other_group:
                                     label += f" ({other_group_name})"
                                 
                                 # Checkbox
-                                is_selected = st.checkbox(
+                                checked[page_tuple] = st.checkbox(
                                     label,
-                                    value=page_tuple in current_group['pages'],
+                                    value=ownership.contains(group_idx, page_tuple),
                                     key=f"page_{pdf_idx}_{page_idx}_group_{st.session_state.current_group}",
                                     disabled=in_other_group
-                                )
-                                
-                                if is_selected and not in_other_group:
-                                    selected_pages.append(page_tuple)
+                                ) and not in_other_group
                 
-                # Atualiza as páginas selecionadas (mantém páginas em branco)
+                # Atualiza as páginas selecionadas: as visíveis seguem os checkboxes, as demais
+                # mantêm o estado; a ordem segue a grade (páginas fora da grade vêm antes)
+                listed = set(pages_to_show)
                 blank_pages = [p for p in current_group['pages'] if p[0] == -1]
-                current_group['pages'] = blank_pages + selected_pages
+                outside = [p for p in ownership.pages(group_idx) if p not in listed]
+                in_grid = [p for p in pages_to_show
+                           if checked.get(p, ownership.contains(group_idx, p) and ownership.owner(p, exclude=group_idx) is None)]
+                ownership.set_pages(group_idx, blank_pages + outside + in_grid)
                 
                 # Mostra páginas em branco
                 if blank_pages:
@@ -1290,20 +990,35 @@ def main():
                     if st.button("🔄", help="Atualizar preview"):
                         st.rerun()
                 
-                # Cria o preview com as configurações atuais
+                # Cria o preview com as configurações atuais: a folha real, composta com as
+                # miniaturas dos slides (memoizada pelo hash da configuração), ou o esquema do grid
                 try:
-                    preview_img = create_layout_preview(current_group['config'], len(current_group['pages']), page_number)
-                    
-                    # Cria uma string única baseada nas configurações principais
-                    config_str = f"{current_group['config']['grid_cols']}x{current_group['config']['grid_rows']}"
-                    config_str += f"_{current_group['config']['page_size']}_{current_group['config']['page_orientation']}"
-                    config_str += f"_{current_group['config']['margin_left']}_{current_group['config']['margin_right']}"
-                    config_str += f"_{current_group['config']['margin_top']}_{current_group['config']['margin_bottom']}"
-                    config_str += f"_{current_group['config']['spacing']}_{current_group['config']['show_borders']}"
-                    config_str += f"_{page_number}"
-                    
-                    # Mostra o preview
-                    st.image(preview_img, use_container_width=True)
+                    if current_group['pages']:
+                        config = current_group['config']
+                        group_sheets = count_sheets([current_group])
+                        
+                        # Numeração global da primeira folha do grupo (as anteriores vêm dos grupos anteriores)
+                        first_sheet_num = 1 + count_sheets(st.session_state.groups[:st.session_state.current_group])
+                        # No modo fichário, mostra a primeira folha do grupo com a paridade escolhida
+                        sheet_index = 0 if first_sheet_num % 2 == page_number % 2 else 1
+                        if sheet_index >= group_sheets:
+                            sheet_index = 0
+                        
+                        preview_img = sheet_preview_png(
+                            get_rendition_cache(),
+                            config,
+                            group_sheet_slides(current_group['pages'], config, sheet_index),
+                            st.session_state.all_images,
+                            first_sheet_num + sheet_index,
+                            get_export_settings(),
+                            current_group['name']
+                        )
+                        st.image(preview_img, use_container_width=True,
+                                 caption=f"Folha {sheet_index + 1} de {group_sheets} do grupo")
+                    else:
+                        preview_img = create_layout_preview(current_group['config'], 0, page_number,
+                                                            st.session_state.get('landscape_binder_mode', False))
+                        st.image(preview_img, use_container_width=True)
                     
                     # Se o modo fichário paisagem estiver ativo, mostra aviso
                     if st.session_state.get('landscape_binder_mode', False):
@@ -1315,28 +1030,26 @@ def main():
                     st.error(f"Erro ao criar preview: {str(e)}")
                     st.info("Tente ajustar as configurações ou clique em 🔄 para atualizar")
                 
-                # Estatísticas do grupo
-                config = current_group['config']
-                total_slides_per_page = config['grid_cols'] * config['grid_rows']
+                # Estatísticas do grupo (mesma geometria da exportação)
+                plan = LayoutPlan.build(current_group['config'])
+                total_slides_per_page = plan.slides_per_page
                 
                 if current_group['pages']:
-                    total_pages_in_group = (len(current_group['pages']) + total_slides_per_page - 1) // total_slides_per_page
+                    total_pages_in_group = plan.sheet_count(len(current_group['pages']))
                     economia = ((len(current_group['pages']) - total_pages_in_group) / len(current_group['pages']) * 100) if len(current_group['pages']) > 0 else 0
                     
                     st.markdown("#### 📊 Estatísticas do Grupo")
                     st.write(f"- Slides: {len(current_group['pages'])}")
                     st.write(f"- Páginas: {total_pages_in_group}")
                     st.write(f"- Por página: {total_slides_per_page}")
+                    if plan.usable:
+                        st.write(f"- Célula: {plan.slide_width / 28.35:.1f} × {plan.slide_height / 28.35:.1f} cm")
                     st.write(f"- Economia: {economia:.1f}%")
                 
                 # Estatísticas totais
                 st.markdown("#### 📈 Total Geral")
                 total_selected = sum(len(g['pages']) for g in st.session_state.groups)
-                total_pages_final = sum(
-                    (len(g['pages']) + g['config']['grid_cols'] * g['config']['grid_rows'] - 1) // 
-                    (g['config']['grid_cols'] * g['config']['grid_rows'])
-                    for g in st.session_state.groups if g['pages']
-                )
+                total_pages_final = count_sheets(st.session_state.groups)
                 if total_selected > 0:
                     total_economia = ((total_selected - total_pages_final) / total_selected * 100)
                     st.write(f"- Total slides: {total_selected}")
@@ -1367,6 +1080,44 @@ def main():
                         index=1,
                         help="DPI maior = melhor qualidade mas processamento mais lento"
                     )
+                    st.session_state.render_format = st.selectbox(
+                        "Páginas renderizadas",
+                        options=list(RENDER_FORMATS),
+                        index=list(RENDER_FORMATS).index(st.session_state.get('render_format', 'Memória')),
+                        help="Memória: o poppler gera PNG, decodificado e mantido em RAM. Arquivos PPM/JPEG: o poppler grava as páginas no cache em disco e elas só são lidas ao montar as folhas (vale para os próximos PDFs importados)"
+                    )
+                    st.session_state.parallel_workers = st.number_input(
+                        "Processos paralelos",
+                        min_value=1,
+                        max_value=64,
+                        value=st.session_state.get('parallel_workers', default_worker_count()),
+                        help="Quantos arquivos, intervalos de páginas ou imagens são processados ao mesmo tempo na importação e na exportação"
+                    )
+                    st.session_state.memory_limit_mb = st.number_input(
+                        "Limite de memória da exportação (MB)",
+                        min_value=0,
+                        max_value=16384,
+                        step=128,
+                        value=st.session_state.get('memory_limit_mb', 0),
+                        help="O modo imagem sempre grava o PDF em janelas de folhas, liberando as imagens depois de escritas. 0 = janelas de poucas folhas; com limite, cada janela tem as folhas cujas imagens cabem nele"
+                    )
+                    st.session_state.output_mode = st.radio(
+                        "Modo de saída",
+                        options=['Imagem (raster)', 'Vetorial (páginas originais)'],
+                        index=0 if st.session_state.get('output_mode', 'Imagem (raster)') == 'Imagem (raster)' else 1,
+                        help="Vetorial posiciona as páginas originais sem rasterizar: arquivo menor, texto nítido e geração muito mais rápida"
+                    )
+                    st.session_state.collect_diagnostics = st.checkbox(
+                        "🩺 Coletar diagnósticos",
+                        value=st.session_state.get('collect_diagnostics', False),
+                        help="Mede o tempo de cada etapa da importação e da exportação (poppler, rotação, codificação, desenho, gravação) e mostra os números no painel de diagnósticos"
+                    )
+                    if st.session_state.collect_diagnostics:
+                        st.session_state.collect_profile = st.checkbox(
+                            "Gerar perfil cProfile da exportação",
+                            value=st.session_state.get('collect_profile', False),
+                            help="Grava um arquivo .prof (formato pstats) para analisar com snakeviz ou pstats; deixa a exportação mais lenta"
+                        )
                 with col2:
                     st.session_state.landscape_binder_mode = st.checkbox(
                         "🔄 Modo Fichário Paisagem",
@@ -1392,7 +1143,7 @@ def main():
                             if os.path.exists(poppler_path):
                                 st.success("✅ Caminho existe!")
                                 # Força nova verificação
-                                st.session_state.poppler_ok = check_poppler()
+                                st.session_state.poppler_ok = check_poppler(refresh=True)
                                 st.rerun()
                             else:
                                 st.error("❌ Caminho não encontrado")
@@ -1401,43 +1152,53 @@ def main():
             total_selected_all_groups = sum(len(g['pages']) for g in st.session_state.groups)
             if st.button("🚀 Gerar PDF Otimizado", type="primary", disabled=total_selected_all_groups == 0):
                 if total_selected_all_groups > 0:
-                    with st.spinner("Gerando PDF otimizado com todos os grupos..."):
-                        output_path = tempfile.mktemp(suffix='.pdf')
-                        create_optimized_pdf_with_groups(st.session_state.groups, st.session_state.all_images, output_path)
-                        
-                        with open(output_path, 'rb') as f:
-                            pdf_data = f.read()
-                        
-                        # Estatísticas
-                        groups_with_pages = [g for g in st.session_state.groups if g['pages']]
-                        
-                        success_msg = "✅ PDF otimizado gerado com sucesso!\n\n"
-                        for group in groups_with_pages:
-                            slides_count = len(group['pages'])
-                            grid = group['config']['grid_cols'] * group['config']['grid_rows']
-                            pages_count = (slides_count + grid - 1) // grid
-                            success_msg += f"**{group['name']}**: {slides_count} slides em {pages_count} páginas (grid {group['config']['grid_cols']}x{group['config']['grid_rows']})\n\n"
-                        
-                        # Adiciona nota sobre modo fichário se ativo
-                        if st.session_state.get('landscape_binder_mode', False):
-                            success_msg += "\n🔄 **Modo Fichário Paisagem ativo**: Margens superior/inferior foram invertidas nas páginas pares (verso) para manter alinhamento visual."
-                        
-                        st.success(success_msg)
-                        
-                        # Download
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        filename = f"slides_otimizados_{timestamp}.pdf"
-                        
-                        st.download_button(
-                            label="📥 Baixar PDF Otimizado",
-                            data=pdf_data,
-                            file_name=filename,
-                            mime="application/pdf"
-                        )
-                        
-                        os.unlink(output_path)
+                    # Descarta a exportação anterior desta sessão
+                    if st.session_state.get('export_job_id'):
+                        get_job_queue().forget(st.session_state.export_job_id)
+                        drop_job_files()
+                    
+                    # A exportação roda na fila do servidor; a sessão continua livre enquanto isso
+                    job = ExportJob(
+                        groups=copy.deepcopy(st.session_state.groups),
+                        output_path=None,
+                        mode='vector' if st.session_state.get('output_mode') == 'Vetorial (páginas originais)' else 'raster',
+                        settings=get_export_settings(),
+                        workers=st.session_state.get('parallel_workers'),
+                        memory_limit_mb=st.session_state.get('memory_limit_mb') or None
+                    )
+                    if job.mode == 'vector':
+                        sources = {idx: f.getvalue() for idx, f in enumerate(st.session_state.pdf_files)}
+                    else:
+                        sources = dict(st.session_state.all_images)
+                    collect_diagnostics = st.session_state.get('collect_diagnostics', False)
+                    st.session_state.export_job_id = get_job_queue().submit(
+                        job, sources, instrument=collect_diagnostics,
+                        profile=collect_diagnostics and st.session_state.get('collect_profile', False)
+                    )
+                    
+                    # Estatísticas
+                    groups_with_pages = [g for g in st.session_state.groups if g['pages']]
+                    
+                    success_msg = "✅ PDF otimizado gerado com sucesso!\n\n"
+                    for group in groups_with_pages:
+                        slides_count = len(group['pages'])
+                        pages_count = LayoutPlan.build(group['config']).sheet_count(slides_count)
+                        success_msg += f"**{group['name']}**: {slides_count} slides em {pages_count} páginas (grid {group['config']['grid_cols']}x{group['config']['grid_rows']})\n\n"
+                    
+                    # Adiciona nota sobre modo fichário se ativo
+                    if st.session_state.get('landscape_binder_mode', False):
+                        success_msg += "\n🔄 **Modo Fichário Paisagem ativo**: Margens superior/inferior foram invertidas nas páginas pares (verso) para manter alinhamento visual."
+                    
+                    st.session_state.export_job_msg = success_msg
                 else:
                     st.warning("⚠️ Por favor, selecione pelo menos uma página em algum grupo.")
+            
+            # Andamento e resultado da exportação (sobrevive a reruns)
+            if st.session_state.get('export_job_id'):
+                show_export_job(st.session_state.export_job_id)
+            
+            # Tempos por etapa (com "Coletar diagnósticos" ativado)
+            show_diagnostics()
     
     # Instruções
     with st.expander("ℹ️ Como usar este aplicativo"):
@@ -1494,8 +1255,11 @@ def main():
 
 # Exportar/Importar configurações
 def export_config():
+    settings = get_export_settings().to_dict()
+    del settings['pdf_names']
     config_data = {
         'groups': st.session_state.groups,
+        'settings': settings,
         'timestamp': datetime.now().isoformat()
     }
     return json.dumps(config_data, indent=2)
@@ -1505,6 +1269,8 @@ def import_config(config_json):
         config_data = json.loads(config_json)
         st.session_state.groups = config_data['groups']
         st.session_state.current_group = 0
+        for key, value in config_data.get('settings', {}).items():
+            st.session_state[key] = value
         return True
     except:
         return False
@@ -0,0 +1,49 @@
+"""Núcleo do Otimizador de Slides PDF, independente do Streamlit."""
+
+from .config import PAGE_SIZES, TEMPLATES, ExportSettings, get_default_config
+from .export import LayoutPlan, create_optimized_pdf_with_groups, create_vector_pdf_with_groups
+from .instrument import Instrumentation
+from .job import ExportJob, OutputFile
+from .jobqueue import JobQueue, JobStatus, default_job_queue
+from .pages import (
+    LazyPdfPages,
+    PageDiskCache,
+    RenditionCache,
+    default_page_disk_cache,
+    default_worker_count,
+    ingest_pdfs,
+    open_pdf_source,
+    pdf_to_images,
+)
+from .poppler import PopplerInfo, discover_poppler, find_poppler
+from .preview import create_layout_preview
+from .selection import PageOwnership
+
+__all__ = [
+    'PAGE_SIZES',
+    'TEMPLATES',
+    'get_default_config',
+    'ExportSettings',
+    'Instrumentation',
+    'ExportJob',
+    'OutputFile',
+    'JobQueue',
+    'JobStatus',
+    'default_job_queue',
+    'LayoutPlan',
+    'create_optimized_pdf_with_groups',
+    'create_vector_pdf_with_groups',
+    'LazyPdfPages',
+    'PageDiskCache',
+    'RenditionCache',
+    'default_page_disk_cache',
+    'default_worker_count',
+    'ingest_pdfs',
+    'open_pdf_source',
+    'pdf_to_images',
+    'PopplerInfo',
+    'discover_poppler',
+    'find_poppler',
+    'create_layout_preview',
+    'PageOwnership',
+]
@@ -0,0 +1,119 @@
+"""
+Linha de comando para gerar o PDF otimizado sem o Streamlit (ex.: jobs em lote).
+
+Uso:
+    projetonicole config.json aula1.pdf aula2.pdf -o saida.pdf
+
+O JSON de configuração tem o formato produzido por `export_config` no aplicativo:
+{"groups": [{"name": ..., "pages": [[pdf_index, page_index], ...], "config": {...}}],
+ "settings": {...}}. Os índices de PDF seguem a ordem dos arquivos na linha de comando
+e `[-1, -1]` indica uma página em branco.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+from pypdf import PdfReader
+
+from .instrument import Instrumentation, enable_json_log
+from .job import ExportJob
+from .pages import LazyPdfPages, default_page_disk_cache
+
+logger = logging.getLogger('slideoptimizer')
+
+
+def load_job_config(path, output_path, **kwargs):
+    """Lê o JSON de configuração e cria o ExportJob correspondente."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return ExportJob.from_dict(data, output_path, **kwargs)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='projetonicole',
+        description="Organiza slides de um ou mais PDFs em um único PDF otimizado para impressão."
+    )
+    parser.add_argument('config', help="JSON com os grupos (formato de export_config)")
+    parser.add_argument('pdfs', nargs='+', help="PDFs de entrada, na ordem dos índices usados nos grupos")
+    parser.add_argument('-o', '--output', required=True, help="caminho do PDF gerado")
+    parser.add_argument('--mode', choices=['raster', 'vector'], default='raster',
+                        help="raster rasteriza os slides; vector posiciona as páginas originais (padrão: raster)")
+    parser.add_argument('--dpi', type=int, default=150, help="DPI de rasterização no modo raster (padrão: 150)")
+    parser.add_argument('--workers', type=int, default=None, help="threads de preparação das imagens")
+    parser.add_argument('--max-memory', type=int, default=None, metavar='MB',
+                        help="limite de memória das imagens de cada janela de folhas no modo raster (padrão: poucas folhas por janela)")
+    parser.add_argument('--render-format', choices=['ppm', 'jpeg'], default=None,
+                        help="renderiza as páginas em arquivos desse formato e só as decodifica ao montar as folhas")
+    parser.add_argument('--poppler-path', default=None, help="pasta bin do Poppler, se não estiver no PATH")
+    parser.add_argument('--no-cache', action='store_true', help="não usa o cache de páginas em disco")
+    parser.add_argument('--watermark', default=None, help="marca d'água global")
+    parser.add_argument('--page-numbers', action='store_true', default=None, help="numeração global de páginas")
+    parser.add_argument('--binder', action='store_true', default=None,
+                        help="modo fichário paisagem (inverte margens nas páginas pares)")
+    parser.add_argument('--lined', action='store_true', default=None, help="páginas em branco pautadas")
+    parser.add_argument('--stats', action='store_true',
+                        help="registra em JSON (no stderr) o tempo, as páginas e os bytes de cada etapa")
+    parser.add_argument('--profile', default=None, metavar='ARQUIVO',
+                        help="grava um perfil cProfile da exportação (abra com pstats ou snakeviz)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="mostra o andamento")
+    return parser
+
+
+def run(args):
+    job = load_job_config(args.config, args.output, mode=args.mode, workers=args.workers,
+                          memory_limit_mb=args.max_memory)
+    
+    # Opções da linha de comando têm prioridade sobre o JSON
+    overrides = {
+        'global_watermark': args.watermark,
+        'global_page_numbers': args.page_numbers,
+        'landscape_binder_mode': args.binder,
+        'blank_pages_lined': args.lined
+    }
+    job.settings = replace(job.settings, **{key: value for key, value in overrides.items() if value is not None},
+                           pdf_names=[Path(path).name for path in args.pdfs])
+    
+    instrumentation = None
+    if args.stats or args.profile:
+        if args.stats:
+            enable_json_log()
+        instrumentation = Instrumentation('export', args.profile, mode=job.mode, output=args.output)
+    
+    start = time.perf_counter()
+    if job.mode == 'vector':
+        job.validate([len(PdfReader(path).pages) for path in args.pdfs])
+        job.run({idx: Path(path).read_bytes() for idx, path in enumerate(args.pdfs)}, instrumentation=instrumentation)
+    else:
+        disk_cache = None if args.no_cache else default_page_disk_cache()
+        all_images = {
+            idx: LazyPdfPages(path, dpi=args.dpi, disk_cache=disk_cache, poppler_path=args.poppler_path,
+                              render_format=args.render_format)
+            for idx, path in enumerate(args.pdfs)
+        }
+        job.validate([len(pages) for pages in all_images.values()])
+        job.run(all_images, instrumentation=instrumentation)
+    
+    logger.info("%s gerado em %.1fs", args.output, time.perf_counter() - start)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(levelname)s: %(message)s')
+    
+    try:
+        run(args)
+    except Exception as e:
+        logger.error("falha ao gerar %s: %s", args.output, e, exc_info=args.verbose)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Tamanhos de página, templates e configuração padrão dos grupos."""
+
+from dataclasses import asdict, dataclass, field, fields
+
+from reportlab.lib.pagesizes import A4, A3, letter, legal
+
+# Dicionário de tamanhos de página
+PAGE_SIZES = {
+    "A4": A4,
+    "A3": A3,
+    "Carta (Letter)": letter,
+    "Ofício (Legal)": legal
+}
+
+# Templates predefinidos
+TEMPLATES = {
+    "Padrão (2x2)": {
+        'grid_cols': 2, 'grid_rows': 2,
+        'margin_left': 3.0, 'margin_right': 1.0,
+        'margin_top': 1.0, 'margin_bottom': 1.0,
+        'page_orientation': 'Paisagem'
+    },
+    "Econômico (3x3)": {
+        'grid_cols': 3, 'grid_rows': 3,
+        'margin_left': 1.0, 'margin_right': 0.5,
+        'margin_top': 0.5, 'margin_bottom': 0.5,
+        'page_orientation': 'Paisagem'
+    },
+    "Revisão Rápida (4x4)": {
+        'grid_cols': 4, 'grid_rows': 4,
+        'margin_left': 1.0, 'margin_right': 0.5,
+        'margin_top': 0.5, 'margin_bottom': 0.5,
+        'page_orientation': 'Paisagem',
+        'show_numbers': True,
+        'number_size': 8
+    },
+    "Anotações (1x2)": {
+        'grid_cols': 1, 'grid_rows': 2,
+        'margin_left': 5.0, 'margin_right': 3.0,
+        'margin_top': 2.0, 'margin_bottom': 2.0,
+        'page_orientation': 'Retrato',
+        'show_borders': True
+    },
+    "Apresentação (1x1)": {
+        'grid_cols': 1, 'grid_rows': 1,
+        'margin_left': 2.0, 'margin_right': 2.0,
+        'margin_top': 2.0, 'margin_bottom': 2.0,
+        'page_orientation': 'Paisagem'
+    },
+    "Handout (2x3)": {
+        'grid_cols': 2, 'grid_rows': 3,
+        'margin_left': 2.0, 'margin_right': 2.0,
+        'margin_top': 2.0, 'margin_bottom': 2.0,
+        'page_orientation': 'Retrato',
+        'spacing': 15
+    }
+}
+
+# Função para criar configuração padrão
+def get_default_config():
+    return {
+        'page_size': 'A4',
+        'page_orientation': 'Paisagem',
+        'grid_cols': 2,
+        'grid_rows': 2,
+        'margin_left': 3.0,
+        'margin_right': 1.0,
+        'margin_top': 1.0,
+        'margin_bottom': 1.0,
+        'spacing': 20,
+        'show_borders': False,
+        'border_width': 0.5,
+        'show_numbers': False,
+        'number_size': 10,
+        'number_position': 'Inferior Esquerdo',
+        'image_quality': 'Alta',
+        'image_format': 'Automático',
+        'print_dpi': 200,
+        'rotate_images': 0,
+        'image_orientation': 'Manter Original',
+        'fit_mode': 'Ajustar (manter visível)',
+        'watermark_text': '',
+        'watermark_size': 40,
+        'watermark_opacity': 0.1,
+        'header_text': '',
+        'footer_text': '',
+        'header_footer_size': 10
+    }
+
+
+@dataclass
+class ExportSettings:
+    """Configurações globais da exportação (compartilhadas por todos os grupos)."""
+    global_watermark: str = ''
+    global_page_numbers: bool = False
+    landscape_binder_mode: bool = False
+    blank_pages_lined: bool = False
+    pdf_names: list = field(default_factory=list)
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Cria a partir de um dicionário (ex.: JSON exportado), ignorando chaves desconhecidas."""
+        known = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in (data or {}).items() if key in known})
+    
+    @classmethod
+    def coerce(cls, settings):
+        """Aceita ExportSettings, dicionário ou None."""
+        if isinstance(settings, cls):
+            return settings
+        return cls.from_dict(settings)
+    
+    def to_dict(self):
+        return asdict(self)
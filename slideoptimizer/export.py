@@ -0,0 +1,965 @@
+"""Geração do PDF otimizado: montagem das folhas em modo imagem (raster) ou vetorial."""
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+from PIL import Image, ImageDraw
+from pypdf import PdfReader, PdfWriter, PageObject, Transformation
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, NameObject
+from reportlab import rl_config
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import landscape, portrait
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from .config import PAGE_SIZES, ExportSettings
+from .instrument import bind, stage
+from .pages import default_worker_count, page_fingerprint
+from .pdfstream import StreamingPdfWriter
+
+# Exportações em andamento dentro de binary_pdf_streams (e o valor de useA85 a restaurar)
+_binary_streams_lock = threading.Lock()
+_binary_streams_users = 0
+_binary_streams_saved = None
+
+@contextmanager
+def binary_pdf_streams():
+    """
+    Grava os streams binários no bloco: sem ASCII85 as imagens ficam ~25% menores e
+    não passam pelo codificador em Python puro (lento sem o rl_accel instalado).
+    O ReportLab só tem a opção global `rl_config.useA85`: ela é desligada enquanto
+    houver uma exportação em andamento e volta ao valor anterior depois da última.
+    """
+    global _binary_streams_users, _binary_streams_saved
+    with _binary_streams_lock:
+        if _binary_streams_users == 0:
+            _binary_streams_saved = rl_config.useA85
+            rl_config.useA85 = 0
+        _binary_streams_users += 1
+    try:
+        yield
+    finally:
+        with _binary_streams_lock:
+            _binary_streams_users -= 1
+            if _binary_streams_users == 0:
+                rl_config.useA85 = _binary_streams_saved
+
+# Tamanho (em pontos/pixels) do desenho da página em branco
+BLANK_PAGE_WIDTH, BLANK_PAGE_HEIGHT = 595, 842
+
+# Função para criar página em branco
+def create_blank_page_image(width=BLANK_PAGE_WIDTH, height=BLANK_PAGE_HEIGHT, lined=False):
+    """Cria uma imagem de página em branco."""
+    img = Image.new('RGB', (int(width), int(height)), 'white')
+    draw = ImageDraw.Draw(img)
+    
+    # Adiciona linhas pautadas opcionalmente
+    if lined:
+        line_spacing = 30
+        margin = 50
+        for y in range(margin + line_spacing, int(height) - margin, line_spacing):
+            draw.line([(margin, y), (int(width) - margin, y)], fill='#e0e0e0', width=1)
+    
+    return img
+
+# Funções auxiliares de geometria e decoração compartilhadas pelos modos de saída
+def get_page_dimensions(config):
+    """Retorna (largura, altura) da folha em pontos para a configuração do grupo."""
+    page_size = PAGE_SIZES[config['page_size']]
+    if config['page_orientation'] == 'Paisagem':
+        return landscape(page_size)
+    return portrait(page_size)
+
+def get_sheet_margins(config, global_page_num, landscape_binder_mode):
+    """Retorna as margens (esquerda, direita, superior, inferior) em pontos para a folha."""
+    margin_left = config['margin_left'] * 28.35
+    margin_right = config['margin_right'] * 28.35
+    margin_top = config['margin_top'] * 28.35
+    margin_bottom = config['margin_bottom'] * 28.35
+    
+    # Páginas pares no modo fichário: inverte apenas as margens superior/inferior
+    if landscape_binder_mode and (global_page_num % 2 == 0):
+        margin_top, margin_bottom = margin_bottom, margin_top
+    
+    return margin_left, margin_right, margin_top, margin_bottom
+
+def compute_slide_positions(config, page_width, page_height, margins, is_flipped_page):
+    """Calcula o tamanho de cada célula e a posição (x, y) de cada slide no grid."""
+    margin_left, margin_right, margin_top, margin_bottom = margins
+    spacing = config['spacing']
+    cols = config['grid_cols']
+    rows = config['grid_rows']
+    
+    slide_width = (page_width - margin_left - margin_right - (cols - 1) * spacing) / cols
+    slide_height = (page_height - margin_top - margin_bottom - (rows - 1) * spacing) / rows
+    
+    positions = []
+    for row in range(rows):
+        for col in range(cols):
+            x = margin_left + col * (slide_width + spacing)
+            
+            if is_flipped_page:
+                # Lógica para páginas PARES (verso): constrói de baixo para cima
+                # Inverte a ordem das linhas para criar o efeito de espelho vertical
+                y = margin_bottom + (rows - 1 - row) * slide_height + (rows - 1 - row) * spacing
+            else:
+                # Lógica para páginas ÍMPARES (frente): constrói de cima para baixo
+                y = page_height - margin_top - (row + 1) * slide_height - row * spacing
+            
+            positions.append((x, y))
+    
+    return slide_width, slide_height, positions
+
+def fit_slide_boxes(aspect_ratios, slide_width, slide_height, fit_mode):
+    """
+    Versão em lote de fit_slide_box: uma tupla (largura, altura, deslocamento x,
+    deslocamento y) por proporção, com a comparação e o modo resolvidos uma vez só.
+    """
+    cell_ratio = slide_width / slide_height
+    cover = fit_mode == 'Preencher (pode cortar)'
+    boxes = []
+    for aspect_ratio in aspect_ratios:
+        # Ocupa a altura da célula (mais largo e "preencher", ou mais estreito e "ajustar")
+        if (aspect_ratio > cell_ratio) == cover:
+            draw_width = slide_height * aspect_ratio
+            boxes.append((draw_width, slide_height, (slide_width - draw_width) / 2, 0.0))
+        else:
+            draw_height = slide_width / aspect_ratio
+            boxes.append((slide_width, draw_height, 0.0, (slide_height - draw_height) / 2))
+    return boxes
+
+def fit_slide_box(aspect_ratio, slide_width, slide_height, fit_mode):
+    """Calcula (largura, altura, deslocamento x, deslocamento y) do slide dentro da célula."""
+    return fit_slide_boxes((aspect_ratio,), slide_width, slide_height, fit_mode)[0]
+
+# Função para calcular a rotação e a proporção final de um slide
+def oriented_aspect(config, src_width, src_height):
+    """
+    Aplica a rotação do grupo (sentido horário, igual a orient_slide_image) e a
+    orientação forçada a uma página de `src_width` x `src_height`.
+    Retorna (ângulo em graus, proporção largura/altura resultante).
+    """
+    angle = -config['rotate_images']
+    if config['rotate_images'] in (90, 270):
+        src_width, src_height = src_height, src_width
+    
+    aspect_ratio = src_width / src_height
+    if (config['image_orientation'] == 'Forçar Paisagem' and aspect_ratio < 1) or \
+       (config['image_orientation'] == 'Forçar Retrato' and aspect_ratio > 1):
+        angle += 90
+        aspect_ratio = 1 / aspect_ratio
+    return angle, aspect_ratio
+
+# Classe com a geometria pré-calculada das folhas de um grupo
+@dataclass(frozen=True)
+class LayoutPlan:
+    """
+    Geometria de uma folha do grupo (tamanho, margens, células) calculada uma vez
+    por configuração e paridade. `flipped` indica o verso do modo fichário, com as
+    margens superior/inferior invertidas. Exportação, previews e estatísticas usam
+    o mesmo plano; coordenadas em pontos, com origem no canto inferior esquerdo.
+    """
+    page_width: float
+    page_height: float
+    margins: tuple
+    flipped: bool
+    cols: int
+    rows: int
+    slide_width: float
+    slide_height: float
+    positions: tuple
+    fit_mode: str
+    
+    @classmethod
+    def build(cls, config, flipped=False):
+        page_width, page_height = get_page_dimensions(config)
+        margins = get_sheet_margins(config, 2 if flipped else 1, flipped)
+        slide_width, slide_height, positions = compute_slide_positions(config, page_width, page_height, margins,
+                                                                       flipped)
+        return cls(page_width, page_height, margins, flipped, config['grid_cols'], config['grid_rows'],
+                   slide_width, slide_height, tuple(positions), config['fit_mode'])
+    
+    @classmethod
+    def for_group(cls, config, landscape_binder_mode=False):
+        """Planos (frente, verso) do grupo; fora do modo fichário, os dois são o mesmo."""
+        front = cls.build(config)
+        return front, cls.build(config, True) if landscape_binder_mode else front
+    
+    @classmethod
+    def for_sheet(cls, config, global_page_num=1, landscape_binder_mode=False):
+        return cls.build(config, landscape_binder_mode and global_page_num % 2 == 0)
+    
+    @property
+    def slides_per_page(self):
+        return self.cols * self.rows
+    
+    @property
+    def cell_size(self):
+        return self.slide_width, self.slide_height
+    
+    @property
+    def usable(self):
+        """Se as margens e o espaçamento ainda deixam área para as células."""
+        return self.slide_width > 0 and self.slide_height > 0
+    
+    def sheet_count(self, slide_count):
+        return (slide_count + self.slides_per_page - 1) // self.slides_per_page
+    
+    def cell_rects(self, count=None):
+        """Retângulos (x, y, largura, altura) das primeiras `count` células (todas por padrão)."""
+        return [(x, y, self.slide_width, self.slide_height) for x, y in self.positions[:count]]
+    
+    def fit(self, aspect_ratios):
+        """
+        Caixas (x, y, largura, altura) onde desenhar slides com essas proporções,
+        um por célula na ordem do grid.
+        """
+        boxes = fit_slide_boxes(aspect_ratios, self.slide_width, self.slide_height, self.fit_mode)
+        return [(x_base + x_offset, y_base + y_offset, draw_width, draw_height)
+                for (x_base, y_base), (draw_width, draw_height, x_offset, y_offset) in zip(self.positions, boxes)]
+
+def draw_sheet_watermark(c, config, page_width, page_height, global_watermark):
+    """
+    Desenha a marca d'água do grupo (ou a global) no centro da folha. Ela fica por
+    baixo de todo o resto, sobre o fundo branco, então a opacidade vira o cinza
+    opaco equivalente (Form XObjects do ReportLab não levam transparência).
+    """
+    watermark = config.get('watermark_text', '') or global_watermark
+    if watermark:
+        c.saveState()
+        c.setFont("Helvetica", config.get('watermark_size', 40))
+        gray = 1 - config.get('watermark_opacity', 0.1)
+        c.setFillColorRGB(gray, gray, gray)
+        c.translate(page_width/2, page_height/2)
+        c.rotate(45)
+        c.drawCentredString(0, 0, watermark)
+        c.restoreState()
+
+def sheet_text_items(config, group_name, page_width, page_height, margin_left, global_page_num, global_page_numbers,
+                     today=None, page_dependent=None):
+    """
+    Lista os textos da folha (cabeçalho, rodapé e numeração global) como
+    (texto, x, y, tamanho da fonte, cinza, alinhamento), com y na linha de base.
+    `today` substitui {date} (padrão: data atual). Com `page_dependent` True/False,
+    lista só os textos que mudam (ou não) com o número da página.
+    """
+    items = []
+    size = config.get('header_footer_size', 10)
+    for key, y in (('header_text', page_height - 20), ('footer_text', 20)):
+        if config.get(key) and page_dependent in (None, '{page}' in config[key]):
+            text = config[key].replace('{page}', str(global_page_num))
+            text = text.replace('{date}', today or datetime.now().strftime('%d/%m/%Y'))
+            text = text.replace('{group}', group_name)
+            items.append((text, margin_left, y, size, 0.2, 'left'))
+    
+    # Numeração global de página
+    if global_page_numbers and page_dependent in (None, True):
+        items.append((f"Página {global_page_num}", page_width - 20, 20, 10, 0.5, 'right'))
+    return items
+
+def draw_sheet_texts(c, config, group_name, page_width, page_height, margin_left, global_page_num, global_page_numbers,
+                     today=None, page_dependent=None):
+    """Desenha cabeçalho, rodapé e numeração global da folha."""
+    for text, x, y, size, gray, align in sheet_text_items(config, group_name, page_width, page_height, margin_left,
+                                                           global_page_num, global_page_numbers, today,
+                                                           page_dependent):
+        c.setFont("Helvetica", size)
+        c.setFillColorRGB(gray, gray, gray)
+        if align == 'right':
+            c.drawRightString(x, y, text)
+        else:
+            c.drawString(x, y, text)
+
+def draw_slide_border(c, config, x_base, y_base, slide_width, slide_height):
+    """Desenha a borda da célula do slide, se configurada."""
+    if config['show_borders']:
+        c.setStrokeColorRGB(0.5, 0.5, 0.5)
+        c.setLineWidth(config['border_width'])
+        c.rect(x_base, y_base, slide_width, slide_height)
+
+def slide_number_item(config, pdf_idx, orig_page_idx, x_base, y_base, slide_width, slide_height, pdf_names=()):
+    """Retorna (texto, x, y) do número da página original na célula, ou None se não houver."""
+    if not (config['show_numbers'] and pdf_idx >= 0):
+        return None
+    
+    original_page_num = orig_page_idx + 1
+    
+    # Mostra nome do PDF se houver múltiplos
+    if len(pdf_names) > 1:
+        pdf_name = pdf_names[pdf_idx]
+        number_text = f"{pdf_name[:10]}... p{original_page_num}"
+    else:
+        number_text = f"{original_page_num}"
+    
+    if config['number_position'] == 'Superior Esquerdo':
+        return number_text, x_base + 5, y_base + slide_height - config['number_size'] - 5
+    elif config['number_position'] == 'Superior Direito':
+        return number_text, x_base + slide_width - 20, y_base + slide_height - config['number_size'] - 5
+    elif config['number_position'] == 'Inferior Esquerdo':
+        return number_text, x_base + 5, y_base + 5
+    elif config['number_position'] == 'Inferior Direito':
+        return number_text, x_base + slide_width - 20, y_base + 5
+    return number_text, x_base + slide_width/2 - 10, y_base + slide_height/2
+
+def draw_slide_number(c, config, pdf_idx, orig_page_idx, x_base, y_base, slide_width, slide_height, pdf_names=()):
+    """Desenha o número da página original dentro da célula do slide."""
+    item = slide_number_item(config, pdf_idx, orig_page_idx, x_base, y_base, slide_width, slide_height, pdf_names)
+    if item is None:
+        return
+    
+    number_text, x, y = item
+    c.setFont("Helvetica", config['number_size'])
+    c.setFillColorRGB(0.3, 0.3, 0.3)
+    c.drawString(x, y, number_text)
+
+# Classe que desenha a decoração das folhas a partir de Form XObjects
+class SheetDecorations:
+    """
+    Grava a decoração fixa de uma folha (marca d'água, cabeçalho e rodapé sem
+    {page}, bordas das células) uma única vez como Form XObject do ReportLab, por
+    grupo e variante (frente/verso no modo fichário, número de células ocupadas).
+    Cada folha só referencia o form e desenha os textos que mudam com a página.
+    `parts` escolhe o que entra: 'watermark', 'texts' e/ou 'borders'.
+    """
+    
+    def __init__(self, c, global_watermark='', global_page_numbers=False,
+                 parts=('watermark', 'texts', 'borders')):
+        self.c = c
+        self.global_watermark = global_watermark
+        self.global_page_numbers = global_page_numbers
+        self.parts = parts
+        self.today = datetime.now().strftime('%d/%m/%Y')
+        self._forms = {}  # (grupo, verso, células) -> nome do form
+    
+    def draw(self, group_idx, config, group_name, plan, count, global_page_num):
+        """Desenha a decoração da folha com o LayoutPlan dela; `count` é o número de células ocupadas."""
+        c = self.c
+        key = (group_idx, plan.flipped, count)
+        if key not in self._forms:
+            self._forms[key] = self._build_form(config, group_name, plan, count, global_page_num)
+        if self._forms[key] is not None:
+            c.doForm(self._forms[key])
+        
+        if 'texts' in self.parts:
+            draw_sheet_texts(c, config, group_name, plan.page_width, plan.page_height, plan.margins[0],
+                             global_page_num, self.global_page_numbers, self.today, page_dependent=True)
+    
+    def _build_form(self, config, group_name, plan, count, global_page_num):
+        """Grava o form da variante e retorna seu nome (None se não houver decoração fixa)."""
+        page_width, page_height, margin_left = plan.page_width, plan.page_height, plan.margins[0]
+        watermark = 'watermark' in self.parts and (config.get('watermark_text', '') or self.global_watermark)
+        texts = 'texts' in self.parts and sheet_text_items(config, group_name, page_width, page_height, margin_left,
+                                                           global_page_num, self.global_page_numbers, self.today,
+                                                           page_dependent=False)
+        borders = 'borders' in self.parts and config['show_borders'] and count
+        if not (watermark or texts or borders):
+            return None
+        
+        c = self.c
+        name = f'Sheet{len(self._forms)}'
+        c.beginForm(name, 0, 0, page_width, page_height)
+        if watermark:
+            draw_sheet_watermark(c, config, page_width, page_height, self.global_watermark)
+        if texts:
+            draw_sheet_texts(c, config, group_name, page_width, page_height, margin_left, global_page_num,
+                             self.global_page_numbers, self.today, page_dependent=False)
+        if borders:
+            for x_base, y_base, slide_width, slide_height in plan.cell_rects(count):
+                draw_slide_border(c, config, x_base, y_base, slide_width, slide_height)
+        c.endForm()
+        return name
+
+# Função para converter a qualidade configurada em valor numérico
+def get_quality_value(image_quality):
+    if image_quality == 'Alta':
+        return 95
+    elif image_quality == 'Média':
+        return 85
+    return 70
+
+# Classe de registro das imagens já preparadas durante uma exportação
+class EncodedImageRegistry:
+    """
+    Guarda cada imagem de slide já girada, reduzida e codificada, chaveada por
+    (página de origem, rotação, orientação, qualidade, formato, célula). Uma mesma página usada
+    em vários lugares é codificada uma única vez, e o ReportLab recebe sempre o
+    mesmo ImageReader, gravando a imagem uma só vez no PDF.
+    """
+    
+    def __init__(self):
+        self._images = {}
+        self.encoded = 0
+        self.uses = 0
+    
+    def __contains__(self, key):
+        return key in self._images
+    
+    @property
+    def reused(self):
+        return max(0, self.uses - self.encoded)
+    
+    def add(self, key, prepared):
+        self._images[key] = prepared
+        self.encoded += 1
+    
+    def get(self, key):
+        self.uses += 1
+        return self._images[key]
+    
+    def clear(self):
+        """Libera as imagens guardadas (os contadores continuam valendo para a exportação toda)."""
+        # O ImageReader de um JPEG guarda em `jpeg_fh` um método ligado a ele mesmo; sem
+        # desfazer esse ciclo, os pixels decodificados só sairiam da memória no coletor de ciclos
+        for image_reader, _ in self._images.values():
+            vars(image_reader).pop('jpeg_fh', None)
+        self._images.clear()
+
+# Função para escolher o codec de uma imagem no modo automático
+def choose_image_format(img, max_colors=256):
+    """Retorna 'PNG' para imagens com poucas cores (texto, diagramas) e 'JPEG' para fotos."""
+    # Amostragem por vizinho mais próximo não cria cores novas
+    sample = img.resize((max(1, img.width // 4), max(1, img.height // 4)), Image.Resampling.NEAREST)
+    return 'PNG' if sample.convert('RGB').getcolors(maxcolors=max_colors) is not None else 'JPEG'
+
+# Função para codificar a imagem de um slide
+def encode_slide_image(img, image_format, quality):
+    """
+    Codifica a imagem para o ReportLab conforme o formato escolhido
+    ('Automático', 'JPEG' ou 'PNG'). JPEG é embutido sem recompressão;
+    PNG (sem perdas) é entregue direto ao ReportLab, que o comprime com Flate.
+    """
+    with stage('encode', pages=1) as counts:
+        if image_format == 'Automático':
+            image_format = choose_image_format(img)
+        
+        if image_format == 'JPEG':
+            img_buffer = io.BytesIO()
+            img.convert('RGB').save(img_buffer, format='JPEG', quality=quality)
+            counts.bytes += img_buffer.tell()
+            img_buffer.seek(0)
+            return ImageReader(img_buffer)
+        
+        # Pixels crus: a compressão (Flate) acontece no drawImage, na etapa 'draw'
+        counts.bytes += img.width * img.height * 3
+        return ImageReader(img.convert('RGB'))
+
+# Função para reduzir a imagem à resolução efetiva de impressão
+def downsample_to_print_size(img, draw_width, draw_height, print_dpi):
+    """
+    Reamostra a imagem para o tamanho impresso da área de desenho (em pontos)
+    na resolução `print_dpi`. Nunca aumenta a imagem; print_dpi 0 mantém o original.
+    """
+    if not print_dpi:
+        return img
+    
+    target_width = max(1, round(draw_width / 72 * print_dpi))
+    target_height = max(1, round(draw_height / 72 * print_dpi))
+    if img.width <= target_width or img.height <= target_height:
+        return img
+    
+    return img.resize((target_width, target_height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+# Função para aplicar a rotação e a orientação forçada de um slide
+def orient_slide_image(img, rotate_images, image_orientation):
+    if rotate_images != 0:
+        img = img.rotate(-rotate_images, expand=True)
+    
+    aspect_ratio = img.width / img.height
+    if (image_orientation == 'Forçar Paisagem' and aspect_ratio < 1) or \
+       (image_orientation == 'Forçar Retrato' and aspect_ratio > 1):
+        img = img.rotate(90, expand=True)
+    return img
+
+# Função para preparar a imagem de um slide para o PDF
+def prepare_slide_image(img, rotate_images, image_orientation, quality, image_format='Automático',
+                        cell_size=None, fit_mode='Ajustar (manter visível)', print_dpi=0):
+    """
+    Aplica a rotação e a orientação forçada, reduz a imagem ao tamanho impresso
+    da célula (`cell_size` em pontos) e só então codifica a imagem (uma vez).
+    Retorna (ImageReader, proporção largura/altura).
+    """
+    with stage('rotate', pages=1):
+        img = orient_slide_image(img, rotate_images, image_orientation)
+    aspect_ratio = img.width / img.height
+    
+    if cell_size is not None:
+        draw_width, draw_height, _, _ = fit_slide_box(aspect_ratio, cell_size[0], cell_size[1], fit_mode)
+        with stage('downsample', pages=1):
+            img = downsample_to_print_size(img, draw_width, draw_height, print_dpi)
+    
+    return encode_slide_image(img, image_format, quality), aspect_ratio
+
+# Função para obter a impressão digital de uma página de origem
+def source_page_hash(all_images_dict, pdf_idx, page_idx):
+    """Impressão digital da página se a fonte souber calculá-la (LazyPdfPages); senão None."""
+    if pdf_idx == -1:
+        return None
+    page_hashes = getattr(all_images_dict[pdf_idx], 'page_hashes', None)
+    return page_hashes()[page_idx] if page_hashes else None
+
+# Função para calcular a chave da imagem preparada de um slide
+def slide_image_key(config, cell_size, pdf_idx, page_idx, page_hash=None):
+    """
+    Chave do EncodedImageRegistry: reúne tudo o que determina a imagem preparada de um slide.
+    Com `page_hash`, páginas de conteúdo idêntico (mesmo em PDFs diferentes) têm a mesma chave.
+    """
+    source = ('page', page_hash) if page_hash else (pdf_idx, page_idx)
+    return source + (config['rotate_images'], config['image_orientation'],
+                     get_quality_value(config['image_quality']), config.get('image_format', 'Automático'),
+                     cell_size, config['fit_mode'], config.get('print_dpi', 0))
+
+# Função executada pelos workers na fase de preparação da exportação
+def prepare_slide_for_key(key, img):
+    """Prepara a imagem de origem conforme os parâmetros contidos na chave do slide."""
+    _, _, rotate_images, image_orientation, quality, image_format, cell_size, fit_mode, print_dpi = key
+    image_reader, aspect_ratio = prepare_slide_image(img, rotate_images, image_orientation, quality,
+                                                     image_format, cell_size, fit_mode, print_dpi)
+    # Decodifica aqui (em paralelo) os pixels que o ReportLab usaria na fase de escrita
+    with stage('decode', pages=1):
+        image_reader.getRGBData()
+    return image_reader, aspect_ratio
+
+# Exceção usada para interromper uma exportação cancelada
+class ExportCancelled(Exception):
+    """Levantada pelo callback de progresso para interromper a exportação."""
+
+# Função para contar as folhas de saída de um conjunto de grupos
+def count_sheets(groups):
+    return sum(LayoutPlan.build(group['config']).sheet_count(len(group['pages'])) for group in groups if group['pages'])
+
+# Memória ocupada pelos pixels de uma imagem PIL
+def image_memory_bytes(img):
+    return img.width * img.height * len(img.getbands())
+
+# Folhas por janela sem limite de memória (ampliada se preciso para ocupar os workers)
+DEFAULT_WINDOW_SHEETS = 4
+
+# Função para calcular quantas folhas cabem em uma janela com limite de memória
+def sheets_per_window(memory_limit, slides_per_page, bytes_per_slide):
+    """Sem estimativa ainda (bytes_per_slide == 0), começa com uma folha só."""
+    if not bytes_per_slide:
+        return 1
+    return max(1, memory_limit // (slides_per_page * bytes_per_slide))
+
+# Função para calcular o tamanho da janela quando não há limite de memória
+def default_window_sheets(slides_per_page, workers):
+    """Algumas folhas, mas com ao menos dois slides por worker para manter o pool ocupado."""
+    return max(DEFAULT_WINDOW_SHEETS, -(-2 * workers // slides_per_page))
+
+# Função para preparar as imagens de uma janela de slides
+def prepare_slide_window(registry, pool, all_images_dict, slide_refs, keys, on_slide=None):
+    """
+    Rasteriza só as páginas da janela ainda não preparadas (em intervalos contíguos por PDF),
+    prepara as imagens em paralelo e as registra. Retorna a memória estimada usada pela janela.
+    Páginas em branco (chave None) não passam por aqui: são desenhadas como vetores.
+    `on_slide()` é chamado nesta thread a cada PDF rasterizado e a cada slide pronto; se
+    levantar uma exceção (ex.: ExportCancelled), os slides ainda na fila são descartados.
+    """
+    on_slide = on_slide or (lambda: None)
+    pending = {}
+    for (pdf_idx, page_idx), key in zip(slide_refs, keys):
+        if key is not None and key not in registry and key not in pending:
+            pending[key] = (pdf_idx, page_idx)
+    
+    rendered = {}
+    for pdf_idx in set(p[0] for p in pending.values()):
+        indices = [page_idx for idx, page_idx in pending.values() if idx == pdf_idx]
+        source = all_images_dict[pdf_idx]
+        get_pages = getattr(source, 'get_pages', None)
+        # Listas de imagens PIL (sem get_pages) já estão rasterizadas
+        rendered[pdf_idx] = get_pages(indices) if get_pages else {i: source[i] for i in indices}
+        on_slide()
+    
+    sources = [rendered[pdf_idx][page_idx] for pdf_idx, page_idx in pending.values()]
+    # Página original + cópia preparada (no máximo do mesmo tamanho)
+    window_bytes = sum(2 * image_memory_bytes(img) for img in sources)
+    prepare = bind(prepare_slide_for_key)
+    futures = [pool.submit(prepare, key, img) for key, img in zip(pending, sources)]
+    try:
+        for key, future in zip(pending, futures):
+            registry.add(key, future.result())
+            on_slide()
+    finally:
+        for future in futures:
+            future.cancel()
+    return window_bytes
+
+# Função para criar o PDF otimizado com grupos
+@binary_pdf_streams()
+def create_optimized_pdf_with_groups(groups, all_images_dict, output_path, workers=None, settings=None,
+                                     memory_limit_mb=None, on_progress=None):
+    """
+    Cria um PDF com múltiplos slides por página baseado nos grupos e suas configurações.
+    Para cada grupo, a preparação das imagens (rotação, redução e codificação) roda em
+    paralelo em `workers` threads; a escrita no canvas é sequencial.
+    `settings` traz as configurações globais (ExportSettings ou dicionário).
+    O grupo é processado em janelas de folhas: cada janela é desenhada em um canvas
+    próprio, gravada no destino e liberada, então a memória não cresce com o número
+    de folhas. Com `memory_limit_mb`, cada janela tem as folhas cujas imagens cabem no
+    limite; sem ele, algumas folhas (ver `default_window_sheets`).
+    `on_progress(folhas_prontas, total_folhas)` é chamado a cada folha e a cada slide
+    preparado; pode levantar ExportCancelled para interromper.
+    """
+    # Configurações globais
+    settings = ExportSettings.coerce(settings)
+    global_watermark = settings.global_watermark
+    global_page_numbers = settings.global_page_numbers
+    landscape_binder_mode = settings.landscape_binder_mode
+    blank_pages_lined = settings.blank_pages_lined
+    pdf_names = settings.pdf_names
+    
+    registry = EncodedImageRegistry()
+    workers = workers or default_worker_count()
+    memory_limit = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+    bytes_per_slide = 0  # Estimativa (maior valor visto) da memória de um slide preparado
+    total_sheets = count_sheets(groups)
+    
+    global_page_num = 0
+    sheets_done = 0
+    
+    def report_progress():
+        if on_progress:
+            on_progress(sheets_done, total_sheets)
+    
+    # Threads, e não processos: ~98% da preparação fica em chamadas do Pillow que soltam o
+    # GIL (resize, transpose, decode e encode), e um pool de processos teria de serializar os
+    # pixels de cada página na ida e na volta (24 páginas A4 a 200 dpi: 280 MB e 0,7 s só de
+    # pickle; 3,55 s com processos contra 2,34 s com threads)
+    with StreamingPdfWriter(output_path) as writer, ThreadPoolExecutor(max_workers=workers) as pool:
+        report_progress()
+        
+        # Processa cada grupo
+        for group_idx, group in enumerate(groups):
+            config = group['config']
+            selected_pages = group['pages']  # Lista de tuplas (pdf_index, page_index)
+            
+            if not selected_pages:
+                continue
+            
+            # Geometria do grupo, calculada uma vez para a frente e o verso
+            plans = LayoutPlan.for_group(config, landscape_binder_mode)
+            page_width, page_height = plans[0].page_width, plans[0].page_height
+            slides_per_page = plans[0].slides_per_page
+            blank_angle, blank_aspect = oriented_aspect(config, BLANK_PAGE_WIDTH, BLANK_PAGE_HEIGHT)
+            
+            # O tamanho da célula não muda entre páginas pares e ímpares (só a posição)
+            keys = [None if pdf_idx == -1 else
+                    slide_image_key(config, plans[0].cell_size, pdf_idx, page_idx,
+                                    source_page_hash(all_images_dict, pdf_idx, page_idx))
+                    for pdf_idx, page_idx in selected_pages]
+            
+            # Janelas de folhas: com limite de memória, o tamanho da janela é recalculado
+            # a partir das páginas já vistas
+            sheet_starts = list(range(0, len(selected_pages), slides_per_page))
+            window_start = 0
+            while window_start < len(sheet_starts):
+                if memory_limit:
+                    window = sheets_per_window(memory_limit, slides_per_page, bytes_per_slide)
+                else:
+                    window = default_window_sheets(slides_per_page, workers)
+                window_sheets = sheet_starts[window_start:window_start + window]
+                window_start += window
+                
+                first_slide = window_sheets[0]
+                last_slide = min(window_sheets[-1] + slides_per_page, len(selected_pages))
+                window_bytes = prepare_slide_window(registry, pool, all_images_dict,
+                                                    selected_pages[first_slide:last_slide],
+                                                    keys[first_slide:last_slide], report_progress)
+                bytes_per_slide = max(bytes_per_slide, window_bytes // (last_slide - first_slide))
+                
+                # Fase de escrita: desenha as folhas da janela em sequência, em um canvas só dela
+                buffer = io.BytesIO()
+                c = canvas.Canvas(buffer, pagesize=(page_width, page_height))
+                decorations = SheetDecorations(c, global_watermark, global_page_numbers)
+                for page_idx in window_sheets:
+                    if page_idx != first_slide:
+                        c.showPage()
+                    global_page_num += 1
+                    
+                    # Verso do modo fichário paisagem: plano com as margens invertidas
+                    is_flipped_page = landscape_binder_mode and (global_page_num % 2 == 0)
+                    plan = plans[is_flipped_page]
+                    
+                    # Adiciona marca d'água, cabeçalho, rodapé, numeração global e bordas
+                    sheet_slides = selected_pages[page_idx:page_idx + slides_per_page]
+                    sheet_keys = keys[page_idx:page_idx + slides_per_page]
+                    decorations.draw(group_idx, config, group['name'], plan, len(sheet_slides), global_page_num)
+                    
+                    # Encaixa todos os slides da folha nas células de uma vez
+                    prepared = [None if key is None else registry.get(key) for key in sheet_keys]
+                    boxes = plan.fit([blank_aspect if item is None else item[1] for item in prepared])
+                    
+                    # Adiciona slides na página atual
+                    for j, (pdf_idx, orig_page_idx) in enumerate(sheet_slides):
+                        x_final, y_final, draw_width, draw_height = boxes[j]
+                        
+                        if pdf_idx == -1:
+                            draw_blank_page_vector(c, x_final, y_final, draw_width, draw_height,
+                                                   blank_angle % 180 != 0, blank_pages_lined)
+                        else:
+                            # Na primeira vez que a imagem aparece, o ReportLab também a comprime
+                            with stage('draw_image', pages=1):
+                                c.drawImage(
+                                    prepared[j][0],
+                                    x_final,
+                                    y_final,
+                                    width=draw_width,
+                                    height=draw_height,
+                                    preserveAspectRatio=True,
+                                    mask='auto'
+                                )
+                        
+                        x_base, y_base = plan.positions[j]
+                        draw_slide_number(c, config, pdf_idx, orig_page_idx, x_base, y_base, *plan.cell_size,
+                                          pdf_names)
+                    
+                    sheets_done += 1
+                    report_progress()
+                
+                # Grava a janela no destino e libera as imagens dela (imagens repetidas em
+                # outras janelas são preparadas de novo, mas gravadas uma vez só)
+                with stage('save') as counts:
+                    c.save()
+                    counts.bytes += writer.append(buffer.getvalue())
+                del c, decorations, buffer
+                registry.clear()
+        
+        with stage('save') as counts:
+            counts.bytes += writer.finish()
+
+# Função para desenhar uma página em branco como vetores
+def draw_blank_page_vector(c, x, y, width, height, rotated=False, lined=False):
+    """
+    Desenha uma página em branco (opcionalmente pautada) na área indicada. O desenho
+    é um Form XObject criado uma vez por documento e variante, e cada página em
+    branco só o referencia.
+    """
+    name = 'BlankPageLined' if lined else 'BlankPage'
+    if not c.hasForm(name):
+        # Usa o mesmo desenho de create_blank_page_image (595x842, linhas a cada 30)
+        c.beginForm(name, 0, 0, BLANK_PAGE_WIDTH, BLANK_PAGE_HEIGHT)
+        c.setFillColorRGB(1, 1, 1)
+        c.rect(0, 0, BLANK_PAGE_WIDTH, BLANK_PAGE_HEIGHT, stroke=0, fill=1)
+        if lined:
+            c.setStrokeColor(HexColor('#e0e0e0'))
+            c.setLineWidth(1)
+            line_spacing = 30
+            margin = 50
+            for line_y in range(margin + line_spacing, BLANK_PAGE_HEIGHT - margin, line_spacing):
+                c.line(margin, BLANK_PAGE_HEIGHT - line_y, BLANK_PAGE_WIDTH - margin, BLANK_PAGE_HEIGHT - line_y)
+        c.endForm()
+    
+    c.saveState()
+    c.translate(x, y)
+    if rotated:
+        c.translate(width, 0)
+        c.rotate(90)
+        width, height = height, width
+    c.scale(width / BLANK_PAGE_WIDTH, height / BLANK_PAGE_HEIGHT)
+    c.doForm(name)
+    c.restoreState()
+
+# Função para transformar uma página de PDF em um Form XObject reutilizável
+def page_to_form_xobject(writer, page):
+    """
+    Converte uma página de origem em um Form XObject registrado no writer.
+    Retorna (referência, caixa) com a caixa visível como (esquerda, base, largura, altura).
+    """
+    # Aplica o /Rotate da página ao conteúdo para trabalhar sempre "em pé"
+    page.transfer_rotation_to_content()
+    box = page.cropbox
+    
+    contents = page.get_contents()
+    form = DecodedStreamObject()
+    form.set_data(contents.get_data() if contents is not None else b'')
+    form[NameObject('/Type')] = NameObject('/XObject')
+    form[NameObject('/Subtype')] = NameObject('/Form')
+    form[NameObject('/BBox')] = ArrayObject(
+        [FloatObject(v) for v in (box.left, box.bottom, box.right, box.top)]
+    )
+    if '/Resources' in page:
+        form[NameObject('/Resources')] = page['/Resources'].clone(writer)
+    else:
+        form[NameObject('/Resources')] = DictionaryObject()
+    
+    # API privada do pypdf (não há equivalente público); a versão fica presa no pyproject.toml
+    xobject = writer._add_object(form.flate_encode())
+    return xobject, (float(box.left), float(box.bottom), float(box.width), float(box.height))
+
+# Função para calcular a matriz que posiciona um Form XObject na célula
+def form_placement_matrix(box, angle, draw_width, draw_height, x_final, y_final):
+    """
+    Monta a matriz de transformação (cm) que leva a caixa da página de origem,
+    girada em `angle` graus (anti-horário), para a área de desenho na folha.
+    """
+    left, bottom, src_width, src_height = box
+    op = Transformation().translate(-left, -bottom).rotate(angle)
+    
+    # Após a rotação a caixa pode ficar em coordenadas negativas: normaliza para a origem
+    corners = [op.apply_on((x, y)) for x, y in
+               ((0, 0), (src_width, 0), (0, src_height), (src_width, src_height))]
+    min_x = min(x for x, _ in corners)
+    min_y = min(y for _, y in corners)
+    rotated_width = max(x for x, _ in corners) - min_x
+    rotated_height = max(y for _, y in corners) - min_y
+    
+    op = op.translate(-min_x, -min_y)
+    op = op.scale(draw_width / rotated_width, draw_height / rotated_height)
+    op = op.translate(x_final, y_final)
+    return op.ctm
+
+# Função para criar o PDF otimizado em modo vetorial
+@binary_pdf_streams()
+def create_vector_pdf_with_groups(groups, pdf_sources, output_path, settings=None, on_progress=None):
+    """
+    Cria um PDF com múltiplos slides por página posicionando as páginas originais
+    como Form XObjects (sem rasterização). `pdf_sources` mapeia pdf_index -> bytes do PDF.
+    `settings` traz as configurações globais (ExportSettings ou dicionário).
+    `on_progress(folhas_prontas, total_folhas)` é chamado a cada folha montada; pode
+    levantar ExportCancelled para interromper.
+    """
+    # Configurações globais
+    settings = ExportSettings.coerce(settings)
+    global_watermark = settings.global_watermark
+    global_page_numbers = settings.global_page_numbers
+    landscape_binder_mode = settings.landscape_binder_mode
+    blank_pages_lined = settings.blank_pages_lined
+    pdf_names = settings.pdf_names
+    
+    # Camadas de decoração desenhadas com o ReportLab:
+    # "under" fica abaixo dos slides (marca d'água, páginas em branco)
+    # "over" fica acima (bordas, numeração, cabeçalho e rodapé)
+    under_buffer = io.BytesIO()
+    over_buffer = io.BytesIO()
+    first_size = get_page_dimensions(groups[0]['config'])
+    c_under = canvas.Canvas(under_buffer, pagesize=first_size)
+    c_over = canvas.Canvas(over_buffer, pagesize=first_size)
+    under_decorations = SheetDecorations(c_under, global_watermark, parts=('watermark',))
+    over_decorations = SheetDecorations(c_over, global_page_numbers=global_page_numbers, parts=('texts', 'borders'))
+    
+    writer = PdfWriter()
+    readers = {}
+    memos = {}  # pdf_idx -> memo das impressões digitais (por documento)
+    page_keys = {}  # (pdf_idx, page_idx) -> impressão digital da página
+    forms = {}  # impressão digital -> (xobject, caixa); páginas idênticas viram um só XObject
+    sheets = []  # Uma lista de posicionamentos por folha
+    
+    first_page = True
+    global_page_num = 1
+    
+    for group_idx, group in enumerate(groups):
+        config = group['config']
+        selected_pages = group['pages']
+        
+        if not selected_pages:
+            continue
+        
+        # Geometria do grupo, calculada uma vez para a frente e o verso
+        plans = LayoutPlan.for_group(config, landscape_binder_mode)
+        page_width, page_height = plans[0].page_width, plans[0].page_height
+        slides_per_page = plans[0].slides_per_page
+        
+        for page_idx in range(0, len(selected_pages), slides_per_page):
+            if not first_page:
+                for c in (c_under, c_over):
+                    c.showPage()
+                    c.setPageSize((page_width, page_height))
+                global_page_num += 1
+            else:
+                first_page = False
+            
+            is_flipped_page = landscape_binder_mode and (global_page_num % 2 == 0)
+            plan = plans[is_flipped_page]
+            
+            sheet_slides = selected_pages[page_idx:page_idx + slides_per_page]
+            for decorations in (under_decorations, over_decorations):
+                decorations.draw(group_idx, config, group['name'], plan, len(sheet_slides), global_page_num)
+            
+            angles = []
+            aspect_ratios = []
+            for pdf_idx, orig_page_idx in sheet_slides:
+                if pdf_idx == -1:  # Página em branco
+                    src_width, src_height = BLANK_PAGE_WIDTH, BLANK_PAGE_HEIGHT
+                else:
+                    key = (pdf_idx, orig_page_idx)
+                    if key not in page_keys:
+                        with stage('forms', pages=1):
+                            if pdf_idx not in readers:
+                                readers[pdf_idx] = PdfReader(io.BytesIO(pdf_sources[pdf_idx]))
+                                memos[pdf_idx] = {}
+                            page = readers[pdf_idx].pages[orig_page_idx]
+                            page_keys[key] = page_fingerprint(page, memos[pdf_idx])
+                            if page_keys[key] not in forms:
+                                forms[page_keys[key]] = page_to_form_xobject(writer, page)
+                    _, (_, _, src_width, src_height) = forms[page_keys[key]]
+                
+                angle, aspect_ratio = oriented_aspect(config, src_width, src_height)
+                angles.append(angle)
+                aspect_ratios.append(aspect_ratio)
+            
+            # Encaixa todos os slides da folha nas células de uma vez
+            boxes = plan.fit(aspect_ratios)
+            
+            placements = []
+            for j, (pdf_idx, orig_page_idx) in enumerate(sheet_slides):
+                x_final, y_final, draw_width, draw_height = boxes[j]
+                
+                if pdf_idx == -1:
+                    draw_blank_page_vector(c_under, x_final, y_final, draw_width, draw_height,
+                                           angles[j] % 180 != 0, blank_pages_lined)
+                else:
+                    placements.append(((pdf_idx, orig_page_idx), angles[j] % 360,
+                                       draw_width, draw_height, x_final, y_final))
+                
+                x_base, y_base = plan.positions[j]
+                draw_slide_number(c_over, config, pdf_idx, orig_page_idx, x_base, y_base, *plan.cell_size, pdf_names)
+            
+            sheets.append(placements)
+    
+    # Fecha a última folha explicitamente: o save() descarta uma página sem desenho
+    with stage('decorations_save') as counts:
+        for c in (c_under, c_over):
+            c.showPage()
+            c.save()
+        counts.bytes += under_buffer.tell() + over_buffer.tell()
+    
+    under_reader = PdfReader(under_buffer)
+    over_reader = PdfReader(over_buffer)
+    
+    # Monta cada folha: decoração inferior, slides (Form XObjects) e decoração superior
+    for sheet_idx, placements in enumerate(sheets):
+        with stage('merge', pages=1):
+            under_page = under_reader.pages[sheet_idx]
+            sheet = writer.add_blank_page(width=under_page.mediabox.width, height=under_page.mediabox.height)
+            sheet.merge_page(under_page)
+            
+            if placements:
+                xobjects = DictionaryObject()
+                operations = []
+                for n, (key, angle, draw_width, draw_height, x_final, y_final) in enumerate(placements):
+                    xobject, box = forms[page_keys[key]]
+                    name = f'/Slide{n}'
+                    xobjects[NameObject(name)] = xobject
+                    matrix = form_placement_matrix(box, angle, draw_width, draw_height, x_final, y_final)
+                    operations.append('q {} cm {} Do Q'.format(' '.join(f'{v:.4f}' for v in matrix), name))
+                
+                slides_page = PageObject.create_blank_page(width=sheet.mediabox.width, height=sheet.mediabox.height)
+                slides_page[NameObject('/Resources')] = DictionaryObject({NameObject('/XObject'): xobjects})
+                slides_content = DecodedStreamObject()
+                slides_content.set_data('\n'.join(operations).encode('latin-1'))
+                slides_page[NameObject('/Contents')] = slides_content
+                sheet.merge_page(slides_page)
+            
+            sheet.merge_page(over_reader.pages[sheet_idx])
+        if on_progress:
+            on_progress(sheet_idx + 1, len(sheets))
+    
+    with stage('save') as counts:
+        with open(output_path, 'wb') as f:
+            writer.write(f)
+            counts.bytes += f.tell()
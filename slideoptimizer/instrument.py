@@ -0,0 +1,193 @@
+"""
+Instrumentação opcional da importação e da exportação: tempo de relógio e de CPU,
+páginas e bytes por etapa, registro em JSON e perfil cProfile. Sem instrumentação
+ativa, cada medição custa só a consulta de uma ContextVar.
+"""
+
+import cProfile
+import contextvars
+import functools
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+
+logger = logging.getLogger(__name__)
+
+_active = contextvars.ContextVar('slideoptimizer_instrumentation', default=None)
+
+
+@dataclass
+class StageStats:
+    """Totais de uma etapa. Em etapas paralelas, `wall` soma o tempo de todas as threads."""
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    pages: int = 0
+    bytes: int = 0
+
+
+class Instrumentation:
+    """
+    Acumula StageStats por etapa enquanto está ativa: na thread que chamou
+    `activate()` e nas tarefas embrulhadas por `bind()` (ex.: pools de workers).
+    Com `profile_path`, roda o cProfile nessas mesmas threads e grava o perfil
+    combinado (formato pstats) ao sair. No Python 3.12+ só um profiler roda por
+    processo: se outro já estiver ativo (ex.: outro job perfilado), esta
+    instrumentação segue medindo as etapas, mas fica sem perfil. `fields`
+    identificam o registro no JSON (ex.: job_id, modo).
+    """
+
+    def __init__(self, name, profile_path=None, **fields):
+        self.name = name
+        self.profile_path = profile_path
+        self.fields = fields
+        self.stages = {}  # etapa -> StageStats, na ordem da primeira medição
+        self.cpu = 0.0
+        self._started = None
+        self._wall = None
+        self._profiles = {}  # thread -> cProfile.Profile
+        self._lock = threading.Lock()
+
+    def add(self, stage, wall=0.0, cpu=0.0, pages=0, bytes=0):
+        with self._lock:
+            stats = self.stages.setdefault(stage, StageStats())
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+            stats.pages += pages
+            stats.bytes += bytes
+
+    @property
+    def wall(self):
+        """Tempo total ativo (até agora, se ainda não terminou)."""
+        if self._wall is not None:
+            return self._wall
+        return time.perf_counter() - self._started if self._started is not None else 0.0
+
+    def _start_profile(self):
+        if not self.profile_path:
+            return None
+        thread = threading.get_ident()
+        with self._lock:
+            profile = self._profiles.get(thread) or cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Outro profiler já ativo. No Python 3.12+ só um profiler pode estar ativo
+            # por processo, e ele mede todas as threads: o desta instrumentação na
+            # thread do job (que já cobre os workers), o de outro job ou o do próprio
+            # script rodando sob cProfile
+            return None
+        with self._lock:
+            self._profiles[thread] = profile
+        return profile
+
+    @contextmanager
+    def _attached(self):
+        """Torna esta a instrumentação ativa na thread atual e soma o tempo de CPU dela."""
+        token = _active.set(self)
+        cpu_start = time.thread_time()
+        profile = self._start_profile()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._lock:
+                self.cpu += time.thread_time() - cpu_start
+            _active.reset(token)
+
+    def run(self, fn, *args, **kwargs):
+        """Executa `fn` nesta thread contando para a instrumentação (ver `bind`)."""
+        with self._attached():
+            return fn(*args, **kwargs)
+
+    @contextmanager
+    def activate(self):
+        """Ativa a instrumentação no bloco; ao sair, grava o registro JSON e o perfil."""
+        self._started = time.perf_counter()
+        try:
+            with self._attached():
+                yield self
+        finally:
+            self._finish()
+
+    def to_dict(self):
+        with self._lock:
+            stages = {stage: asdict(stats) for stage, stats in self.stages.items()}
+            cpu = self.cpu
+        return {'name': self.name, **self.fields, 'wall': self.wall, 'cpu': cpu, 'stages': stages}
+
+    def _finish(self):
+        self._wall = time.perf_counter() - self._started
+        logger.info(json.dumps(self.to_dict(), ensure_ascii=False))
+        if self.profile_path:
+            self._dump_profile()
+    
+    def _dump_profile(self):
+        """Grava o perfil combinado; uma falha aqui nunca derruba a importação/exportação."""
+        try:
+            profiles = list(self._profiles.values())
+            for profile in profiles:
+                profile.create_stats()
+            profiles = [profile for profile in profiles if profile.stats]
+            if not profiles:
+                logger.warning("perfil de %s não gravado: outro profiler já estava ativo", self.name)
+                return
+            pstats.Stats(*profiles).dump_stats(self.profile_path)
+        except Exception:
+            logger.exception("falha ao gravar o perfil de %s em %s", self.name, self.profile_path)
+
+
+def activate(instrumentation):
+    """Contexto que ativa `instrumentation`, ou não faz nada se ela for None."""
+    return instrumentation.activate() if instrumentation is not None else nullcontext()
+
+
+def bind(fn):
+    """
+    Faz `fn`, executada em outra thread (ex.: submetida a um pool), contar para a
+    instrumentação ativa na thread atual. Sem instrumentação, retorna `fn` sem mudança.
+    """
+    instrumentation = _active.get()
+    if instrumentation is None:
+        return fn
+    return functools.partial(instrumentation.run, fn)
+
+
+@contextmanager
+def stage(name, pages=0, bytes=0):
+    """
+    Mede o bloco como a etapa `name` da instrumentação ativa (sem instrumentação, não
+    mede nada). O objeto devolvido recebe contagens conhecidas só dentro do bloco:
+    `with stage('encode') as counts: ...; counts.bytes += len(data)`.
+    """
+    counts = StageStats(pages=pages, bytes=bytes)
+    instrumentation = _active.get()
+    if instrumentation is None:
+        yield counts
+        return
+
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield counts
+    finally:
+        instrumentation.add(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start,
+                            counts.pages, counts.bytes)
+
+
+def enable_json_log(stream=None):
+    """Envia o registro JSON de cada importação/exportação instrumentada para `stream` (padrão: stderr)."""
+    if not any(getattr(handler, 'slideopt_json', False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.slideopt_json = True
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
@@ -0,0 +1,110 @@
+"""Descrição explícita de um job de exportação, independente da interface."""
+
+import os
+import tempfile
+import weakref
+from dataclasses import dataclass, field
+
+from .config import ExportSettings, get_default_config
+from .export import create_optimized_pdf_with_groups, create_vector_pdf_with_groups
+from .instrument import activate
+from .pages import _remove_file
+
+
+def normalize_groups(raw_groups):
+    """Normaliza grupos vindos de JSON: páginas como tuplas e config completada com o padrão."""
+    groups = []
+    for i, group in enumerate(raw_groups):
+        groups.append({
+            'name': group.get('name', f'Grupo {i + 1}'),
+            'pages': [tuple(page) for page in group.get('pages', [])],
+            'config': {**get_default_config(), **group.get('config', {})}
+        })
+    return groups
+
+
+class OutputFile:
+    """
+    Arquivo temporário que recebe o PDF gerado. O conteúdo fica só no disco até
+    ser lido com `open()` ou `read()` (ex.: para servir o download).
+    O arquivo é apagado com `discard()` ou quando o objeto é coletado.
+    """
+    
+    def __init__(self, suffix='.pdf', directory=None):
+        fd, self.path = tempfile.mkstemp(suffix=suffix, dir=directory)
+        os.close(fd)
+        self._finalizer = weakref.finalize(self, _remove_file, self.path)
+    
+    @property
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+    
+    def open(self):
+        return open(self.path, 'rb')
+    
+    def read(self):
+        with self.open() as f:
+            return f.read()
+    
+    def discard(self):
+        self._finalizer()
+
+
+@dataclass
+class ExportJob:
+    """
+    Tudo o que é preciso para gerar um PDF: grupos (nome, páginas e config),
+    configurações globais, modo ('raster' ou 'vector') e destino. `memory_limit_mb`
+    limita a memória das imagens de cada janela de folhas no modo raster (None =
+    poucas folhas por janela).
+    """
+    groups: list
+    output_path: str
+    mode: str = 'raster'
+    settings: ExportSettings = field(default_factory=ExportSettings)
+    workers: int | None = None
+    memory_limit_mb: int | None = None
+    
+    @classmethod
+    def from_dict(cls, data, output_path, **kwargs):
+        """Cria o job a partir do formato de `export_config` ({"groups": [...], "settings": {...}})."""
+        return cls(
+            groups=normalize_groups(data['groups']),
+            output_path=output_path,
+            settings=ExportSettings.from_dict(data.get('settings')),
+            **kwargs
+        )
+    
+    def validate(self, page_counts):
+        """Verifica se todas as páginas referenciadas existem nos PDFs de entrada."""
+        if not any(group['pages'] for group in self.groups):
+            raise ValueError("nenhum grupo tem páginas selecionadas")
+        
+        for group in self.groups:
+            for pdf_idx, page_idx in group['pages']:
+                if pdf_idx == -1:
+                    continue
+                if not 0 <= pdf_idx < len(page_counts):
+                    raise ValueError(f"{group['name']}: PDF {pdf_idx} não foi informado")
+                if not 0 <= page_idx < page_counts[pdf_idx]:
+                    raise ValueError(f"{group['name']}: página {page_idx + 1} não existe no PDF {pdf_idx}")
+    
+    def run(self, sources, on_progress=None, instrumentation=None):
+        """
+        Gera o PDF em `output_path`. `sources` mapeia pdf_index -> bytes do PDF no modo
+        vetorial, ou -> sequência de páginas (ex.: LazyPdfPages) no modo raster.
+        `on_progress(folhas_prontas, total_folhas)` acompanha a geração. Com uma
+        Instrumentation, mede as etapas da exportação (ver `instrument.py`).
+        """
+        with activate(instrumentation):
+            if self.mode == 'vector':
+                create_vector_pdf_with_groups(self.groups, sources, self.output_path, settings=self.settings,
+                                              on_progress=on_progress)
+            else:
+                create_optimized_pdf_with_groups(self.groups, sources, self.output_path, workers=self.workers,
+                                                 settings=self.settings, memory_limit_mb=self.memory_limit_mb,
+                                                 on_progress=on_progress)
+        return self.output_path
@@ -0,0 +1,180 @@
+"""Fila de exportações em segundo plano, compartilhada por todas as sessões do servidor."""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+
+from .export import ExportCancelled
+from .instrument import Instrumentation, enable_json_log
+from .job import OutputFile
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobStatus:
+    """Estado de um job: 'queued', 'running', 'done', 'failed' ou 'cancelled'."""
+    job_id: str
+    state: str = 'queued'
+    done: int = 0
+    total: int = 0
+    position: int = 0  # Jobs na frente deste na fila (só enquanto 'queued')
+    error: str = ''
+    output: OutputFile | None = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    instrumentation: Instrumentation | None = None
+    profile: OutputFile | None = None  # Perfil cProfile (formato pstats) do job, se pedido
+    
+    @property
+    def finished(self):
+        return self.state in ('done', 'failed', 'cancelled')
+    
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+    
+    @property
+    def stats(self):
+        """Tempos e contagens por etapa (até agora, se o job ainda roda); None sem instrumentação."""
+        return self.instrumentation.to_dict() if self.instrumentation else None
+
+
+class JobQueue:
+    """
+    Executa ExportJobs em até `max_concurrent` threads, para que alguns jobs enormes
+    não monopolizem o servidor. Cada job recebe um ID; o estado e o PDF gerado
+    continuam disponíveis entre reruns até `forget()` ou até expirarem
+    (`keep_finished` segundos depois de terminar). Com `instrument`, todos os jobs
+    são instrumentados, e não só os submetidos com `instrument=True`.
+    """
+    
+    def __init__(self, max_concurrent=2, keep_finished=3600, instrument=False):
+        self.max_concurrent = max_concurrent
+        self.keep_finished = keep_finished
+        self.instrument = instrument
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='export')
+        self._jobs = {}  # job_id -> (JobStatus, Future, Event de cancelamento)
+        self._lock = threading.Lock()
+    
+    def submit(self, job, sources, instrument=False, profile=False):
+        """
+        Enfileira o job (o `output_path` é substituído por um OutputFile) e retorna o ID.
+        `instrument` mede as etapas (ver `JobStatus.stats`); `profile` grava também um
+        perfil cProfile em `JobStatus.profile`.
+        """
+        self._expire()
+        job_id = uuid.uuid4().hex
+        output = OutputFile(suffix='.pdf')
+        job = replace(job, output_path=output.path)
+        status = JobStatus(job_id=job_id, output=output)
+        if profile:
+            status.profile = OutputFile(suffix='.prof')
+        if instrument or profile or self.instrument:
+            status.instrumentation = Instrumentation('export', status.profile.path if profile else None,
+                                                     job_id=job_id, mode=job.mode)
+        cancel_event = threading.Event()
+        
+        with self._lock:
+            future = self._executor.submit(self._run, status, job, sources, cancel_event)
+            self._jobs[job_id] = (status, future, cancel_event)
+        return job_id
+    
+    def _run(self, status, job, sources, cancel_event):
+        with self._lock:
+            if cancel_event.is_set():
+                self._finish(status, 'cancelled')
+                return
+            status.state = 'running'
+        
+        def on_progress(done, total):
+            if cancel_event.is_set():
+                raise ExportCancelled()
+            with self._lock:
+                status.done, status.total = done, total
+        
+        try:
+            job.run(sources, on_progress=on_progress, instrumentation=status.instrumentation)
+        except ExportCancelled:
+            with self._lock:
+                self._finish(status, 'cancelled')
+        except Exception as e:
+            logger.exception("Falha no job de exportação %s", status.job_id)
+            with self._lock:
+                status.error = str(e)
+                self._finish(status, 'failed')
+        else:
+            with self._lock:
+                self._finish(status, 'done')
+    
+    def _finish(self, status, state):
+        status.state = state
+        status.finished_at = time.time()
+        if state != 'done' and status.output is not None:
+            status.output.discard()
+            status.output = None
+    
+    def status(self, job_id):
+        """Retorna uma cópia do JobStatus (ou None se o ID não existir mais)."""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return None
+            status = entry[0]
+            position = 0
+            if status.state == 'queued':
+                position = sum(1 for other, _, _ in self._jobs.values()
+                               if other.state == 'queued' and other.submitted_at < status.submitted_at)
+            return replace(status, position=position)
+    
+    def cancel(self, job_id):
+        """Cancela um job na fila ou em execução (interrompe no próximo slide preparado ou na próxima folha)."""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return
+            status, future, cancel_event = entry
+            cancel_event.set()
+            if future.cancel():
+                self._finish(status, 'cancelled')
+    
+    def forget(self, job_id):
+        """Cancela (se preciso) e descarta o job e o PDF gerado."""
+        self.cancel(job_id)
+        with self._lock:
+            entry = self._jobs.pop(job_id, None)
+            if entry is not None and entry[0].finished:
+                for output in (entry[0].output, entry[0].profile):
+                    if output is not None:
+                        output.discard()
+    
+    def _expire(self):
+        """Descarta jobs terminados há mais de `keep_finished` segundos."""
+        limit = time.time() - self.keep_finished
+        with self._lock:
+            expired = [job_id for job_id, (status, _, _) in self._jobs.items()
+                       if status.finished and status.finished_at < limit]
+        for job_id in expired:
+            self.forget(job_id)
+    
+    def shutdown(self):
+        with self._lock:
+            for _, _, cancel_event in self._jobs.values():
+                cancel_event.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def default_job_queue():
+    """
+    Cria a JobQueue configurada por SLIDEOPT_MAX_JOBS (exportações simultâneas no servidor).
+    Com SLIDEOPT_INSTRUMENT=1, todos os jobs são instrumentados e registram suas etapas
+    em JSON no stderr.
+    """
+    instrument = os.environ.get('SLIDEOPT_INSTRUMENT', '') not in ('', '0')
+    if instrument:
+        enable_json_log()
+    return JobQueue(max_concurrent=int(os.environ.get('SLIDEOPT_MAX_JOBS', '2')), instrument=instrument)
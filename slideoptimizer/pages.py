@@ -0,0 +1,690 @@
+"""Acesso às páginas dos PDFs: rasterização sob demanda, caches e importação paralela."""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+import pdf2image
+from PIL import Image
+from pypdf import PdfReader
+from pypdf.generic import IndirectObject, StreamObject
+
+from .instrument import bind, stage
+from .poppler import discover_poppler
+
+logger = logging.getLogger(__name__)
+
+# Função para converter páginas PDF em imagens
+def pdf_to_images(pdf_path, dpi=150, first_page=None, last_page=None, size=None, thread_count=4,
+                  poppler_path=None):
+    """
+    Converte as páginas de um PDF (ou apenas o intervalo first_page..last_page, base 1) em imagens.
+    Se `size` for informado, o poppler renderiza direto nesse tamanho (maior lado, em pixels).
+    O conversor e o formato vêm da procura em cache (`discover_poppler`), a partir de
+    `poppler_path` ou do PATH. Retorna None se a conversão falhar.
+    """
+    poppler = discover_poppler(poppler_path)
+    try:
+        with stage('poppler') as counts:
+            images = pdf2image.convert_from_path(
+                pdf_path, dpi=dpi, thread_count=thread_count, first_page=first_page, last_page=last_page,
+                size=size, **poppler.convert_kwargs('png')
+            )
+            counts.pages += len(images)
+        return images
+    except Exception as e:
+        logger.error("Erro ao converter PDF em imagens (verifique a instalação do Poppler): %s", e)
+        return None
+
+# Função para renderizar páginas PDF direto em arquivos
+def render_pages_to_files(pdf_path, output_folder, fmt='ppm', dpi=150, first_page=None, last_page=None, size=None,
+                          thread_count=4, poppler_path=None, jpeg_quality=90):
+    """
+    Renderiza as páginas em arquivos `fmt` ('ppm' ou 'jpeg') dentro de `output_folder`
+    e retorna os caminhos na ordem das páginas, sem decodificar nada. PPM sai do
+    pdftoppm (o pdftocairo não gera PPM). Retorna None se a conversão falhar.
+    """
+    kwargs = discover_poppler(poppler_path).convert_kwargs(fmt)
+    kwargs['fmt'] = fmt
+    if fmt == 'jpeg':
+        kwargs['jpegopt'] = {'quality': jpeg_quality}
+    try:
+        with stage('poppler') as counts:
+            paths = pdf2image.convert_from_path(
+                pdf_path, dpi=dpi, thread_count=thread_count, first_page=first_page, last_page=last_page,
+                size=size, output_folder=output_folder, paths_only=True, **kwargs
+            )
+            counts.pages += len(paths)
+        return paths
+    except Exception as e:
+        logger.error("Erro ao converter PDF em arquivos (verifique a instalação do Poppler): %s", e)
+        return None
+
+# Função para contar as páginas de um PDF sem rasterizá-lo
+def get_pdf_page_count(pdf_path, poppler_path=None):
+    """Lê o número de páginas via pdfinfo, com fallback para o pypdf."""
+    poppler = discover_poppler(poppler_path)
+    if not poppler.found:
+        return len(PdfReader(pdf_path).pages)
+    try:
+        kwargs = {'poppler_path': poppler.poppler_path} if poppler.poppler_path else {}
+        return int(pdf2image.pdfinfo_from_path(pdf_path, **kwargs)['Pages'])
+    except Exception:
+        return len(PdfReader(pdf_path).pages)
+
+# Função para agrupar índices de página em intervalos contíguos
+def page_ranges(indices):
+    """Agrupa índices (base 0) em intervalos contíguos [(primeiro, último), ...]."""
+    ranges = []
+    for index in sorted(set(indices)):
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], index)
+        else:
+            ranges.append((index, index))
+    return ranges
+
+# Função para calcular o hash do conteúdo de um arquivo
+def file_content_hash(path, chunk_size=1024 * 1024):
+    """Retorna o SHA-256 (hex) do conteúdo do arquivo."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Chaves da página que determinam o que é desenhado (anotações e /Parent ficam de fora)
+FINGERPRINT_PAGE_KEYS = ('/Contents', '/Resources', '/MediaBox', '/CropBox', '/Rotate', '/Group')
+
+def _digest_pdf_object(obj, digest, memo):
+    """Alimenta `digest` com um objeto do pypdf, seguindo referências (cada objeto indireto é resumido uma vez)."""
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref not in memo:
+            memo[ref] = b'cycle'  # Referência circular: entra só o marcador
+            sub_digest = hashlib.sha256()
+            _digest_pdf_object(obj.get_object(), sub_digest, memo)
+            memo[ref] = sub_digest.digest()
+        digest.update(memo[ref])
+    elif isinstance(obj, dict):
+        digest.update(b'<<')
+        for key in sorted(obj):
+            if key not in ('/Parent', '/P'):
+                digest.update(key.encode())
+                _digest_pdf_object(obj.raw_get(key) if hasattr(obj, 'raw_get') else obj[key], digest, memo)
+        digest.update(b'>>')
+        if isinstance(obj, StreamObject):
+            digest.update(obj.get_data())
+    elif isinstance(obj, list):
+        digest.update(b'[')
+        for item in obj:
+            _digest_pdf_object(item, digest, memo)
+        digest.update(b']')
+    else:
+        digest.update(repr(obj).encode())
+
+# Função para calcular a impressão digital do conteúdo de uma página
+def page_fingerprint(page, memo=None):
+    """
+    SHA-256 (hex) do que a página desenha: conteúdo, recursos (fontes, imagens...)
+    e caixas. Páginas iguais em arquivos diferentes têm a mesma impressão digital.
+    `memo` (por documento) evita resumir de novo recursos compartilhados entre páginas.
+    """
+    memo = {} if memo is None else memo
+    digest = hashlib.sha256()
+    for key in FINGERPRINT_PAGE_KEYS:
+        if key in page:
+            digest.update(key.encode())
+            _digest_pdf_object(page.raw_get(key), digest, memo)
+    return digest.hexdigest()
+
+# Função para calcular a impressão digital de todas as páginas de um PDF
+def page_fingerprints(pdf_path):
+    memo = {}
+    with stage('fingerprint') as counts:
+        fingerprints = [page_fingerprint(page, memo) for page in PdfReader(pdf_path).pages]
+        counts.pages += len(fingerprints)
+    return fingerprints
+
+# Classe de cache das renderizações codificadas (miniaturas)
+class RenditionCache:
+    """
+    Cache LRU em memória de renderizações já codificadas (bytes JPEG),
+    chaveado por (hash do conteúdo do PDF, página, tamanho alvo).
+    Seguro para uso entre sessões/threads do Streamlit.
+    """
+    
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+    
+    def put(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+# Classe de cache persistente em disco das páginas renderizadas
+class PageDiskCache:
+    """
+    Cache em disco, endereçado por conteúdo, das páginas renderizadas.
+    Cada página vira um arquivo em <raiz>/<sha256>/<variante>/, onde a variante
+    identifica a renderização (ex.: "dpi150", "thumb300"). O tamanho total é
+    limitado a `max_bytes`, removendo os arquivos usados há mais tempo (LRU
+    pelo mtime, atualizado a cada acerto). Compartilhado entre sessões e
+    reinícios do servidor.
+    """
+    
+    def __init__(self, root, max_bytes=2 * 1024 ** 3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.total_bytes = sum(size for _, _, size in self._scan())
+    
+    def _scan(self):
+        """Lista (caminho, mtime, tamanho) de todos os arquivos do cache."""
+        entries = []
+        for path in self.root.glob('*/*/*'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+    
+    def _path(self, content_hash, variant, name):
+        return self.root / content_hash / variant / name
+    
+    def _read(self, path):
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # Marca como usado recentemente
+        except OSError:
+            data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+    
+    def _write(self, path, data):
+        # Grava em arquivo temporário e renomeia para não expor arquivos pela metade
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self._added(len(data))
+    
+    def _added(self, size):
+        with self._lock:
+            self.total_bytes += size
+            over_limit = self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+    
+    def evict(self):
+        """Remove os arquivos menos usados até o cache ficar em 90% do limite."""
+        entries = sorted(self._scan(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self.total_bytes = total
+    
+    def get_page(self, content_hash, variant, index):
+        """Retorna a imagem da página em cache ou None."""
+        data = self._read(self._path(content_hash, variant, f"{index:05d}.png"))
+        if data is None:
+            return None
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return img
+    
+    def put_page(self, content_hash, variant, index, img):
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG', compress_level=1)
+        self._write(self._path(content_hash, variant, f"{index:05d}.png"), buffer.getvalue())
+    
+    def get_bytes(self, content_hash, variant, name):
+        """Retorna os bytes de uma renderização já codificada (ex.: miniatura JPEG) ou None."""
+        return self._read(self._path(content_hash, variant, name))
+    
+    def put_bytes(self, content_hash, variant, name, data):
+        self._write(self._path(content_hash, variant, name), data)
+    
+    def get_file(self, content_hash, variant, name):
+        """Retorna o caminho de um arquivo em cache (sem ler o conteúdo) ou None."""
+        path = self._path(content_hash, variant, name)
+        try:
+            os.utime(path)  # Marca como usado recentemente
+            found = True
+        except OSError:
+            found = False
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return str(path) if found else None
+    
+    def put_file(self, content_hash, variant, name, src_path):
+        """Move um arquivo já renderizado para o cache e retorna o novo caminho."""
+        path = self._path(content_hash, variant, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = os.path.getsize(src_path)
+        shutil.move(src_path, path)
+        self._added(size)
+        return str(path)
+    
+    def staging_dir(self):
+        """Pasta temporária no mesmo disco do cache, para que `put_file` só renomeie."""
+        return tempfile.mkdtemp(dir=self.root)
+    
+    def get_page_count(self, content_hash):
+        data = self._read(self._path(content_hash, 'meta', 'info.json'))
+        return json.loads(data)['pages'] if data is not None else None
+    
+    def put_page_count(self, content_hash, page_count):
+        self._write(self._path(content_hash, 'meta', 'info.json'), json.dumps({'pages': page_count}).encode())
+    
+    def get_page_hashes(self, content_hash):
+        data = self._read(self._path(content_hash, 'meta', 'pages.json'))
+        return json.loads(data) if data is not None else None
+    
+    def put_page_hashes(self, content_hash, page_hashes):
+        self._write(self._path(content_hash, 'meta', 'pages.json'), json.dumps(page_hashes).encode())
+    
+    def stats(self):
+        """Retorna contadores de uso do cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+# Função para criar o cache em disco padrão
+def default_page_disk_cache():
+    """Cria o PageDiskCache configurado por SLIDEOPT_CACHE_DIR e SLIDEOPT_CACHE_MAX_MB."""
+    root = os.environ.get('SLIDEOPT_CACHE_DIR', os.path.join(Path.home(), '.cache', 'projetonicole', 'pages'))
+    max_mb = int(os.environ.get('SLIDEOPT_CACHE_MAX_MB', '2048'))
+    return PageDiskCache(root, max_bytes=max_mb * 1024 * 1024)
+
+# Função para codificar uma miniatura
+def encode_thumbnail(img, quality=80):
+    """Codifica a miniatura como JPEG e retorna os bytes."""
+    with stage('thumbnail_encode', pages=1) as counts:
+        buffer = io.BytesIO()
+        img.convert('RGB').save(buffer, format='JPEG', quality=quality)
+        counts.bytes += buffer.tell()
+    return buffer.getvalue()
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+# Classe para acessar as páginas de um PDF sob demanda
+class LazyPdfPages:
+    """
+    Sequência das páginas de um PDF que só rasteriza uma página quando ela é
+    acessada. Mantém em memória apenas as últimas `max_cached_pages` páginas
+    em resolução cheia (usadas na exportação); as miniaturas ficam codificadas
+    no RenditionCache compartilhado. Com um PageDiskCache, páginas e miniaturas
+    já renderizadas antes (por qualquer sessão) são lidas do disco sem poppler.
+    
+    Com `render_format` ('ppm' ou 'jpeg'), o poppler grava as páginas em arquivos
+    e só os caminhos ficam guardados: cada imagem é aberta sob demanda e só é
+    decodificada (PPM via mmap) quando usada na composição. As miniaturas saem do
+    poppler já em JPEG. Sem `render_format`, as páginas são decodificadas em memória.
+    
+    Páginas repetidas (mesma impressão digital, ver `page_hashes`) são renderizadas
+    uma vez por documento, e as miniaturas são compartilhadas também entre documentos.
+    """
+    
+    def __init__(self, pdf_path, dpi=150, max_cached_pages=8, owns_file=False, rendition_cache=None,
+                 disk_cache=None, poppler_path=None, render_format=None, content_hash=None):
+        if render_format not in (None, 'ppm', 'jpeg'):
+            raise ValueError(f"formato de renderização inválido: {render_format!r}")
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.poppler_path = poppler_path
+        self.render_format = render_format
+        self.max_cached_pages = max_cached_pages
+        self.content_hash = content_hash or file_content_hash(pdf_path)
+        self.rendition_cache = rendition_cache if rendition_cache is not None else RenditionCache()
+        self.disk_cache = disk_cache
+        self._pages = OrderedDict()
+        self._files = {}  # índice -> caminho da página renderizada (com `render_format`)
+        self._page_hashes = None
+        self._first_index = None  # impressão digital -> primeiro índice com ela
+        self._hash_lock = threading.Lock()  # Calcula as impressões digitais uma vez só
+        self._lock = threading.Lock()  # A exportação pode rodar em outra thread
+        
+        self.page_count = disk_cache.get_page_count(self.content_hash) if disk_cache else None
+        if self.page_count is None:
+            self.page_count = get_pdf_page_count(pdf_path, poppler_path=self.poppler_path)
+            if disk_cache:
+                disk_cache.put_page_count(self.content_hash, self.page_count)
+        
+        # Remove o arquivo temporário quando o objeto for descartado
+        if owns_file:
+            weakref.finalize(self, _remove_file, pdf_path)
+        
+        # Sem cache em disco, as páginas renderizadas ficam numa pasta própria
+        self._render_dir = None
+        if render_format and not disk_cache:
+            self._render_dir = tempfile.mkdtemp(prefix='slideopt-pages-')
+            weakref.finalize(self, shutil.rmtree, self._render_dir, True)
+    
+    def __len__(self):
+        return self.page_count
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.page_count
+        if not 0 <= index < self.page_count:
+            raise IndexError(f"Página {index} fora do intervalo (0-{self.page_count - 1})")
+        return self.get_pages([index])[index]
+    
+    def __iter__(self):
+        for index in range(self.page_count):
+            yield self[index]
+    
+    def page_hashes(self):
+        """Impressão digital de cada página (calculada uma vez e guardada no cache em disco)."""
+        with self._hash_lock:
+            if self._page_hashes is None:
+                self._compute_page_hashes()
+            return self._page_hashes
+    
+    def _compute_page_hashes(self):
+        hashes = self.disk_cache.get_page_hashes(self.content_hash) if self.disk_cache else None
+        if hashes is None:
+            try:
+                hashes = page_fingerprints(self.pdf_path)
+            except Exception as e:
+                # Sem impressão digital, cada página é considerada única
+                logger.warning("Não foi possível comparar as páginas de %s: %s", self.pdf_path, e)
+                hashes = [f"{self.content_hash}:{index}" for index in range(self.page_count)]
+            if self.disk_cache:
+                self.disk_cache.put_page_hashes(self.content_hash, hashes)
+        
+        first_index = {}
+        for index, page_hash in enumerate(hashes):
+            first_index.setdefault(page_hash, index)
+        self._first_index = first_index
+        self._page_hashes = hashes
+    
+    def canonical_index(self, index):
+        """Primeira página do documento com o mesmo conteúdo que `index`."""
+        page_hashes = self.page_hashes()
+        return self._first_index[page_hashes[index]]
+    
+    def _remember(self, index, img):
+        with self._lock:
+            self._pages[index] = img
+            self._pages.move_to_end(index)
+            while len(self._pages) > self.max_cached_pages:
+                self._pages.popitem(last=False)
+    
+    def _recall(self, index):
+        with self._lock:
+            img = self._pages.get(index)
+            if img is not None:
+                self._pages.move_to_end(index)
+            return img
+    
+    def get_pages(self, indices):
+        """Retorna {índice: imagem} rasterizando as páginas ausentes em intervalos contíguos."""
+        canonical = {index: self.canonical_index(index) for index in indices}
+        if self.render_format:
+            files = self.get_page_files(canonical.values())
+            return {index: Image.open(files[first]) for index, first in canonical.items()}
+        
+        pages = {}
+        missing = []
+        for index in set(canonical.values()):
+            img = self._recall(index)
+            if img is not None:
+                pages[index] = img
+                continue
+            img = self.disk_cache.get_page(self.content_hash, f"dpi{self.dpi}", index) if self.disk_cache else None
+            if img is not None:
+                pages[index] = img
+                self._remember(index, img)
+            else:
+                missing.append(index)
+        
+        for first, last in page_ranges(missing):
+            images = pdf_to_images(self.pdf_path, dpi=self.dpi, first_page=first + 1, last_page=last + 1,
+                                   poppler_path=self.poppler_path)
+            if not images:
+                raise RuntimeError(f"Não foi possível rasterizar as páginas {first + 1}-{last + 1}")
+            for index, img in zip(range(first, last + 1), images):
+                pages[index] = img
+                self._remember(index, img)
+                if self.disk_cache:
+                    self.disk_cache.put_page(self.content_hash, f"dpi{self.dpi}", index, img)
+        
+        return {index: pages[first] for index, first in canonical.items()}
+    
+    def get_page_files(self, indices):
+        """Retorna {índice: caminho do arquivo} renderizando as páginas ausentes (com `render_format`)."""
+        variant = f"dpi{self.dpi}-{self.render_format}"
+        name = "{:05d}." + self.render_format
+        files = {}
+        missing = []
+        for index in set(indices):
+            with self._lock:
+                path = self._files.get(index)
+            if path is None and self.disk_cache:
+                path = self.disk_cache.get_file(self.content_hash, variant, name.format(index))
+            if path is not None and os.path.exists(path):
+                files[index] = path
+            else:
+                missing.append(index)
+        
+        for first, last in page_ranges(missing):
+            folder = self.disk_cache.staging_dir() if self.disk_cache else self._render_dir
+            try:
+                paths = render_pages_to_files(self.pdf_path, folder, self.render_format, dpi=self.dpi,
+                                              first_page=first + 1, last_page=last + 1,
+                                              poppler_path=self.poppler_path)
+                if not paths:
+                    raise RuntimeError(f"Não foi possível rasterizar as páginas {first + 1}-{last + 1}")
+                for index, path in zip(range(first, last + 1), paths):
+                    if self.disk_cache:
+                        path = self.disk_cache.put_file(self.content_hash, variant, name.format(index), path)
+                    files[index] = path
+                    with self._lock:
+                        self._files[index] = path
+            finally:
+                if self.disk_cache:
+                    shutil.rmtree(folder, ignore_errors=True)
+        
+        return files
+    
+    def _render_thumbnails(self, first, last, size, thread_count):
+        """Renderiza as miniaturas first..last (base 0) e retorna os bytes JPEG na ordem."""
+        if not self.render_format:
+            images = pdf_to_images(self.pdf_path, first_page=first + 1, last_page=last + 1, size=size,
+                                   thread_count=thread_count, poppler_path=self.poppler_path)
+            return [encode_thumbnail(img) for img in images] if images else None
+        
+        # O poppler já grava o JPEG final: nada é decodificado nem recodificado
+        with tempfile.TemporaryDirectory(prefix='slideopt-thumbs-') as folder:
+            paths = render_pages_to_files(self.pdf_path, folder, 'jpeg', first_page=first + 1, last_page=last + 1,
+                                          size=size, thread_count=thread_count, poppler_path=self.poppler_path,
+                                          jpeg_quality=80)
+            return [Path(path).read_bytes() for path in paths] if paths else None
+    
+    def get_thumbnails(self, indices, size=300, thread_count=4):
+        """
+        Retorna {índice: bytes JPEG} das miniaturas (maior lado = `size` pixels).
+        As ausentes são renderizadas direto pelo poppler nesse tamanho, sem passar
+        pela resolução cheia.
+        """
+        page_hashes = self.page_hashes()
+        canonical = {index: self.canonical_index(index) for index in indices}
+        thumbnails = {}
+        missing = []
+        for index in set(canonical.values()):
+            key = ('page', page_hashes[index], size)
+            data = self.rendition_cache.get(key)
+            if data is None and self.disk_cache:
+                data = self.disk_cache.get_bytes(self.content_hash, f"thumb{size}", f"{index:05d}.jpg")
+                if data is not None:
+                    self.rendition_cache.put(key, data)
+            if data is None:
+                missing.append(index)
+            else:
+                thumbnails[index] = data
+        
+        for first, last in page_ranges(missing):
+            datas = self._render_thumbnails(first, last, size, thread_count)
+            if not datas:
+                raise RuntimeError(f"Não foi possível gerar miniaturas das páginas {first + 1}-{last + 1}")
+            for index, data in zip(range(first, last + 1), datas):
+                self.rendition_cache.put(('page', page_hashes[index], size), data)
+                if self.disk_cache:
+                    self.disk_cache.put_bytes(self.content_hash, f"thumb{size}", f"{index:05d}.jpg", data)
+                thumbnails[index] = data
+        
+        return {index: thumbnails[first] for index, first in canonical.items()}
+
+# Função para definir o número padrão de processos paralelos
+def default_worker_count():
+    """Número de núcleos disponíveis para este processo."""
+    if hasattr(os, 'sched_getaffinity'):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 4
+
+# Função para abrir um PDF enviado como fonte de páginas
+def open_pdf_source(pdf_data, dpi=150, **source_kwargs):
+    """Grava os bytes do PDF em um arquivo temporário e retorna o LazyPdfPages correspondente."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        tmp_file.write(pdf_data)
+        tmp_path = tmp_file.name
+    
+    try:
+        return LazyPdfPages(tmp_path, dpi=dpi, owns_file=True, **source_kwargs)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+# Função para abrir um PDF e comparar suas páginas (etapa inicial da importação)
+def _open_and_fingerprint(pdf_data, dpi, content_hash, source_kwargs):
+    source = open_pdf_source(pdf_data, dpi, content_hash=content_hash, **source_kwargs)
+    source.page_hashes()
+    return source
+
+# Função para importar vários PDFs em paralelo
+def ingest_pdfs(pdf_datas, dpi=150, workers=None, chunk_size=8, thumbnail_size=300, on_progress=None,
+                known_sources=None, eager_thumbnails=48, **source_kwargs):
+    """
+    Abre os PDFs e pré-gera as miniaturas das primeiras `eager_thumbnails` páginas de
+    cada um (a primeira página da grade; None pré-gera todas), distribuindo arquivos e
+    intervalos de páginas entre `workers` threads (o trabalho pesado roda nos processos
+    do poppler). As demais miniaturas são geradas sob demanda pela grade.
+    `on_progress(índice do arquivo, miniaturas prontas, total a pré-gerar)` é chamado
+    na thread que chamou a função. Retorna, na ordem de entrada, um LazyPdfPages ou a
+    exceção que impediu a abertura de cada arquivo; uma falha ao pré-gerar miniaturas
+    só é registrada no log.
+    
+    Arquivos de conteúdo idêntico (entre si ou a um dos `known_sources`, mapeados por
+    `content_hash`) são abertos uma vez só e recebem o mesmo LazyPdfPages.
+    """
+    results = [None] * len(pdf_datas)
+    done = [0] * len(pdf_datas)
+    
+    def eager_count(source):
+        return len(source) if eager_thumbnails is None else min(len(source), eager_thumbnails)
+    
+    with stage('hash', bytes=sum(len(data) for data in pdf_datas)):
+        hashes = [hashlib.sha256(data).hexdigest() for data in pdf_datas]
+    first_with_hash = {}
+    for i, content_hash in enumerate(hashes):
+        first_with_hash.setdefault(content_hash, i)
+    known_sources = known_sources or {}
+    
+    # Threads, e não processos: o parse das impressões digitais segura o GIL (~98% em Python
+    # puro), mas é rápido (~2000-3000 páginas/s; 0,12-0,15 s para 500 páginas) e fica no cache
+    # em disco, enquanto um processo novo (spawn) leva ~0,45 s só para subir e importar o
+    # pacote. O resto (poppler, decodificação e JPEG das miniaturas) já roda fora do GIL
+    with ThreadPoolExecutor(max_workers=workers or default_worker_count()) as pool:
+        pending = {}
+        for i, data in enumerate(pdf_datas):
+            if hashes[i] not in known_sources and first_with_hash[hashes[i]] == i:
+                pending[pool.submit(bind(_open_and_fingerprint), data, dpi, hashes[i], source_kwargs)] = ('open', i)
+        
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task, i = pending.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    if task == 'open':
+                        results[i] = e
+                        continue
+                    # Miniaturas que falharem são tentadas de novo quando a grade as pedir
+                    logger.warning("Falha ao pré-gerar miniaturas de %s: %s", results[i].pdf_path, e)
+                    value = ()
+                
+                if task == 'open':
+                    # Arquivo aberto: distribui as primeiras miniaturas em blocos de páginas
+                    results[i] = value
+                    for start in range(0, eager_count(value), chunk_size):
+                        indices = range(start, min(start + chunk_size, eager_count(value)))
+                        pending[pool.submit(bind(value.get_thumbnails), indices, thumbnail_size, 1)] = ('thumbs', i)
+                else:
+                    done[i] += len(value)
+                
+                if on_progress:
+                    on_progress(i, done[i], eager_count(results[i]))
+    
+    # Duplicatas recebem o resultado do primeiro arquivo igual (ou da fonte já conhecida)
+    for i, content_hash in enumerate(hashes):
+        if results[i] is None:
+            results[i] = known_sources.get(content_hash) or results[first_with_hash[content_hash]]
+            if on_progress and not isinstance(results[i], Exception):
+                on_progress(i, eager_count(results[i]), eager_count(results[i]))
+    
+    return results
@@ -0,0 +1,177 @@
+"""Gravação incremental de um PDF montado a partir de PDFs parciais (ex.: um canvas do ReportLab por janela de folhas)."""
+
+import hashlib
+import io
+import os
+
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+
+def _references(obj, skip=()):
+    """Referências indiretas contidas em `obj` (sem resolvê-las), exceto nas chaves `skip` do nível de cima."""
+    found = []
+    stack = [value for key, value in dict.items(obj) if key not in skip] if isinstance(obj, DictionaryObject) else [obj]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, IndirectObject):
+            found.append(value)
+        elif isinstance(value, DictionaryObject):
+            stack.extend(dict.values(value))
+        elif isinstance(value, ArrayObject):
+            stack.extend(list.__iter__(value))
+    return found
+
+
+def _renumber(obj, numbers):
+    """Troca, no próprio objeto, cada referência pelo número correspondente em `numbers`."""
+    if isinstance(obj, IndirectObject):
+        return IndirectObject(numbers[obj.idnum], 0, None)
+    if isinstance(obj, DictionaryObject):
+        for key, value in list(dict.items(obj)):
+            dict.__setitem__(obj, key, _renumber(value, numbers))
+    elif isinstance(obj, ArrayObject):
+        for i, value in enumerate(list(list.__iter__(obj))):
+            list.__setitem__(obj, i, _renumber(value, numbers))
+    return obj
+
+
+def _serialize(obj):
+    buffer = io.BytesIO()
+    obj.write_to_stream(buffer)
+    return buffer.getvalue()
+
+
+class StreamingPdfWriter:
+    """
+    Grava no destino (caminho ou arquivo binário) as páginas de cada PDF parcial
+    assim que ele chega (`append`) e fecha o documento com a árvore de páginas, o
+    xref e o trailer (`finish`). Só os offsets dos objetos e os números das páginas
+    ficam na memória, qualquer que seja o tamanho do documento. Objetos sem
+    referências a outros (imagens, fontes) repetidos entre PDFs parciais são
+    gravados uma vez só, como o ReportLab já faz dentro de um mesmo documento.
+    """
+
+    def __init__(self, output):
+        if isinstance(output, (str, os.PathLike)):
+            self._file = open(output, 'wb')
+            self._owns_file = True
+        else:
+            self._file = output
+            self._owns_file = False
+        self._offsets = []  # número do objeto - 1 -> posição no arquivo (None = reservado)
+        self._position = 0
+        self._page_numbers = []
+        self._leaves = {}  # digest do objeto serializado -> número
+        self._info = None
+        self._pages = self._reserve()
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._owns_file:
+            self._file.close()
+
+    @property
+    def size(self):
+        """Bytes gravados até agora."""
+        return self._position
+
+    def _write(self, data):
+        self._file.write(data)
+        self._position += len(data)
+
+    def _reserve(self):
+        self._offsets.append(None)
+        return len(self._offsets)
+
+    def _write_object(self, number, data):
+        self._offsets[number - 1] = self._position
+        self._write(b'%d 0 obj\n' % number + data + b'\nendobj\n')
+
+    def append(self, data):
+        """Acrescenta as páginas do PDF parcial `data` (bytes) e retorna quantos bytes foram gravados."""
+        start = self._position
+        with io.BytesIO(data) as stream:
+            reader = PdfReader(stream)
+            try:
+                self._append_pages(reader)
+            finally:
+                # Os objetos lidos apontam para o leitor e vice-versa; sem desfazer o ciclo,
+                # as imagens da janela só seriam liberadas pelo coletor de ciclos
+                reader.resolved_objects.clear()
+                reader.flattened_pages = None
+        return self._position - start
+
+    def _append_pages(self, reader):
+        page_ids = [page.indirect_reference.idnum for page in reader.pages]
+        is_page = set(page_ids).__contains__
+        roots = [page.indirect_reference for page in reader.pages]
+        info = reader.trailer.get('/Info') if self._info is None else None
+        if isinstance(info, IndirectObject):
+            roots.append(info)
+
+        # Objetos alcançáveis a partir das páginas (sem subir pelo /Parent) e das informações
+        objects = {}
+        stack = list(roots)
+        while stack:
+            ref = stack.pop()
+            if ref.idnum in objects:
+                continue
+            obj = ref.get_object()
+            objects[ref.idnum] = obj
+            stack.extend(_references(obj, skip=('/Parent',) if is_page(ref.idnum) else ()))
+
+        # Folhas (sem referências) são gravadas já, reaproveitando as repetidas; as demais recebem número
+        numbers = {}
+        for idnum, obj in objects.items():
+            if is_page(idnum) or _references(obj):
+                continue
+            body = _serialize(obj)
+            digest = hashlib.sha1(body).digest()
+            if digest not in self._leaves:
+                self._leaves[digest] = self._reserve()
+                self._write_object(self._leaves[digest], body)
+            numbers[idnum] = self._leaves[digest]
+        written = set(numbers)
+        for idnum in objects:
+            if idnum not in written:
+                numbers[idnum] = self._reserve()
+
+        for idnum, obj in objects.items():
+            if idnum in written:
+                continue
+            if is_page(idnum):
+                dict.pop(obj, NameObject('/Parent'), None)
+            obj = _renumber(obj, numbers)
+            if is_page(idnum):
+                dict.__setitem__(obj, NameObject('/Parent'), IndirectObject(self._pages, 0, None))
+            self._write_object(numbers[idnum], _serialize(obj))
+
+        self._page_numbers.extend(numbers[idnum] for idnum in page_ids)
+        if isinstance(info, IndirectObject):
+            self._info = numbers[info.idnum]
+
+    def finish(self):
+        """Grava a árvore de páginas, o catálogo, o xref e o trailer; retorna quantos bytes foram gravados."""
+        start = self._position
+        pages = DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Count'): NumberObject(len(self._page_numbers)),
+            NameObject('/Kids'): ArrayObject(IndirectObject(number, 0, None) for number in self._page_numbers),
+        })
+        self._write_object(self._pages, _serialize(pages))
+        catalog = self._reserve()
+        self._write_object(catalog, b'<< /Type /Catalog /Pages %d 0 R >>' % self._pages)
+
+        xref_position = self._position
+        entries = [b'xref\n0 %d\n0000000000 65535 f \n' % (len(self._offsets) + 1)]
+        entries.extend(b'%010d 00000 n \n' % offset for offset in self._offsets)
+        self._write(b''.join(entries))
+        info = b' /Info %d 0 R' % self._info if self._info else b''
+        self._write(b'trailer\n<< /Size %d /Root %d 0 R%s >>\nstartxref\n%d\n%%%%EOF\n'
+                    % (len(self._offsets) + 1, catalog, info, xref_position))
+        self._file.flush()
+        return self._position - start
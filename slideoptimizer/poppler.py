@@ -0,0 +1,177 @@
+"""Localização dos executáveis do Poppler (pdfinfo, pdftoppm, ...), sem interface."""
+
+import os
+import platform
+import re
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+
+# Comandos do poppler usados para verificar a instalação
+POPPLER_COMMANDS = ['pdfinfo', 'pdfimages', 'pdftoppm', 'pdftocairo']
+
+
+def common_poppler_paths(system=None):
+    """Locais comuns onde o poppler pode estar instalado em cada sistema operacional."""
+    system = system or platform.system()
+    if system == "Windows":
+        return [
+            r"C:\Program Files\poppler\Library\bin",
+            r"C:\Program Files (x86)\poppler\Library\bin",
+            r"C:\poppler\Library\bin",
+            r"C:\msys64\mingw64\bin",
+            r"C:\tools\poppler\Library\bin"
+        ]
+    if system == "Darwin":  # macOS
+        return [
+            "/usr/local/bin",
+            "/opt/homebrew/bin",
+            "/opt/local/bin",
+            "/usr/bin"
+        ]
+    return [  # Linux
+        "/usr/bin",
+        "/usr/local/bin",
+        "/snap/bin"
+    ]
+
+
+def _executable(path, cmd):
+    full_cmd = os.path.join(path, cmd)
+    if platform.system() == "Windows":
+        full_cmd += ".exe"
+    return full_cmd
+
+
+def _run(cmd, flag):
+    """Executa `cmd flag` e retorna stdout + stderr, ou None se o comando não puder ser executado."""
+    try:
+        if platform.system() == "Windows" and not os.path.isabs(cmd):
+            result = subprocess.run([f'{cmd}.exe', flag], capture_output=True, text=True, shell=True)
+        else:
+            result = subprocess.run([cmd, flag], capture_output=True, text=True)
+    except (FileNotFoundError, OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0 and 'version' not in (result.stdout + result.stderr).lower():
+        return None
+    return result.stdout + result.stderr
+
+
+def _responds(cmd):
+    """Executa `cmd -v` e diz se a saída parece ser de um poppler funcional."""
+    return _run(cmd, '-v') is not None
+
+
+def find_poppler(custom_path=None):
+    """
+    Procura o poppler e retorna a pasta dos executáveis, na ordem: `custom_path`,
+    PATH do sistema ('' indica que os comandos do PATH funcionam) e locais comuns.
+    Retorna None se não encontrar.
+    """
+    if custom_path and os.path.exists(custom_path):
+        if any(os.path.exists(_executable(custom_path, cmd)) for cmd in POPPLER_COMMANDS):
+            return custom_path
+    
+    # Primeiro tenta no PATH padrão
+    if any(_responds(cmd) for cmd in POPPLER_COMMANDS):
+        return ''
+    
+    # Tenta nos caminhos comuns
+    for path in common_poppler_paths():
+        for cmd in POPPLER_COMMANDS:
+            full_cmd = _executable(path, cmd)
+            if os.path.exists(full_cmd) and _responds(full_cmd):
+                return path
+    return None
+
+
+@dataclass(frozen=True)
+class PopplerInfo:
+    """
+    Resultado da procura pelo poppler. `path` segue a convenção de `find_poppler`
+    ('' = PATH do sistema, None = não encontrado); `formats` são os formatos de
+    imagem aceitos pelo conversor (pdftocairo, se disponível, senão pdftoppm).
+    """
+    path: str | None = None
+    version: str = ''
+    pdftocairo: bool = False
+    formats: tuple = ()
+    
+    @property
+    def found(self):
+        return self.path is not None
+    
+    @property
+    def poppler_path(self):
+        """Valor para o argumento `poppler_path` do pdf2image (None = usar o PATH)."""
+        return self.path or None
+    
+    def convert_kwargs(self, fmt='png'):
+        """Argumentos do pdf2image para converter com o melhor conversor disponível (PPM só no pdftoppm)."""
+        kwargs = {'use_pdftocairo': self.pdftocairo and fmt != 'ppm'}
+        if self.poppler_path:
+            kwargs['poppler_path'] = self.poppler_path
+        if fmt in self.formats:
+            kwargs['fmt'] = fmt
+        return kwargs
+
+
+def probe_poppler(custom_path=None):
+    """Localiza o poppler (como `find_poppler`) e levanta versão, conversores e formatos."""
+    path = find_poppler(custom_path)
+    if path is None:
+        return PopplerInfo()
+    
+    def command(cmd):
+        return _executable(path, cmd) if path else cmd
+    
+    pdftocairo = _responds(command('pdftocairo'))
+    converter = command('pdftocairo' if pdftocairo else 'pdftoppm')
+    version_text = _run(converter, '-v') or ''
+    version = re.search(r'version\s+([\d.]+)', version_text)
+    help_text = _run(converter, '-h') or ''
+    formats = tuple(fmt for fmt in ('png', 'jpeg', 'tiff', 'ppm') if f'-{fmt}' in help_text)
+    return PopplerInfo(path=path, version=version.group(1) if version else '', pdftocairo=pdftocairo,
+                       formats=formats)
+
+
+class PopplerDiscovery:
+    """
+    Cache, para o processo inteiro, do resultado de `probe_poppler` por caminho
+    customizado. Cada resultado (inclusive "não encontrado") vale por `ttl` segundos;
+    `refresh=True` força uma nova procura.
+    """
+    
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._results = {}  # custom_path -> (instante da procura, PopplerInfo)
+        self._lock = threading.Lock()
+    
+    def get(self, custom_path=None, refresh=False):
+        key = custom_path or None
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and not refresh and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+            # A procura roda sob o lock para que sessões simultâneas não repitam os subprocessos
+            info = probe_poppler(key)
+            self._results[key] = (time.monotonic(), info)
+            return info
+    
+    def invalidate(self):
+        with self._lock:
+            self._results.clear()
+
+
+_discovery = PopplerDiscovery(ttl=int(os.environ.get('SLIDEOPT_POPPLER_TTL', '3600')))
+
+
+def discover_poppler(custom_path=None, refresh=False):
+    """`probe_poppler` com o cache do processo (validade definida por SLIDEOPT_POPPLER_TTL, em segundos)."""
+    return _discovery.get(custom_path, refresh=refresh)
+
+
+def forget_poppler():
+    """Descarta o resultado em cache (ex.: depois de instalar o poppler)."""
+    _discovery.invalidate()
@@ -0,0 +1,261 @@
+"""Previews de uma folha: esquemático (sem páginas) e com o conteúdo real dos slides."""
+
+import hashlib
+import io
+import json
+from datetime import date
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .config import ExportSettings
+from .export import (
+    LayoutPlan,
+    create_blank_page_image,
+    orient_slide_image,
+    sheet_text_items,
+    slide_number_item,
+)
+
+# Largura padrão dos previews, em pixels
+PREVIEW_WIDTH = 400
+
+
+# Função para criar preview do layout
+def create_layout_preview(config, selected_count=4, page_number=1, landscape_binder_mode=False):
+    """Cria uma imagem de preview do layout baseado nas configurações."""
+    # Mesma geometria da exportação (margens invertidas nas páginas pares do modo fichário)
+    plan = LayoutPlan.for_sheet(config, page_number, landscape_binder_mode)
+    invert_margins = plan.flipped
+    
+    # Dimensões do preview (proporcionais ao papel real)
+    preview_width = PREVIEW_WIDTH
+    scale = preview_width / plan.page_width
+    preview_height = int(plan.page_height * scale)
+    
+    def to_pixels(x, y):
+        # Coordenadas do PDF (origem embaixo) para pixels (origem em cima)
+        return x * scale, (plan.page_height - y) * scale
+    
+    # Cria imagem do preview
+    img = Image.new('RGB', (preview_width, preview_height), 'white')
+    draw = ImageDraw.Draw(img)
+    
+    # Margens na escala do preview
+    margin_left, margin_right, margin_top, margin_bottom = (margin * scale for margin in plan.margins)
+    
+    # Área útil
+    usable_width = preview_width - margin_left - margin_right
+    usable_height = preview_height - margin_top - margin_bottom
+    
+    # Desenha fundo e área de margens
+    draw.rectangle([0, 0, preview_width, preview_height], fill='#f0f0f0')
+    draw.rectangle([margin_left, margin_top, preview_width - margin_right, preview_height - margin_bottom], fill='white')
+    
+    # Verifica se há espaço suficiente
+    if usable_width > 10 and usable_height > 10 and plan.usable:
+        # Desenha marca d'água se configurada
+        if config.get('watermark_text', ''):
+            # Texto da marca d'água
+            watermark = config['watermark_text']
+            # Desenha no centro em cinza claro
+            text_x = preview_width // 2
+            text_y = preview_height // 2
+            draw.text((text_x, text_y), watermark, 
+                     fill=(220, 220, 220), anchor="mm")
+        
+        # Desenha cabeçalho se configurado
+        if config.get('header_text', ''):
+            draw.text((margin_left + 5, margin_top - 15), config['header_text'], 
+                     fill='#333333')
+        
+        # Desenha os slides
+        for slide_num, (x_base, y_base, slide_width, slide_height) in enumerate(
+                plan.cell_rects(max(0, selected_count)), start=1):
+            x, y = to_pixels(x_base, y_base + slide_height)
+            x2, y2 = to_pixels(x_base + slide_width, y_base)
+            
+            # Desenha retângulo do slide
+            if config['show_borders']:
+                draw.rectangle([x, y, x2, y2], 
+                             fill='white', outline='#666666', width=2)
+            else:
+                draw.rectangle([x, y, x2, y2], 
+                             fill='white', outline='#e0e0e0', width=1)
+            
+            # Adiciona número do slide no centro (sem rotação)
+            draw.text(((x + x2) / 2, (y + y2) / 2), f"{slide_num}", fill='#666666', anchor="mm")
+        
+        # Desenha rodapé se configurado
+        if config.get('footer_text', ''):
+            draw.text((margin_left + 5, preview_height - margin_bottom + 5), 
+                     config['footer_text'], fill='#333333')
+        
+        # Indicador de margens invertidas se ativo
+        if invert_margins:
+            # Adiciona texto indicando inversão
+            draw.text((preview_width - 130, 10), "⇅ Margens sup/inf invertidas", fill='#ff6666')
+    else:
+        # Se não há espaço suficiente, mostra mensagem
+        msg = "Margens muito grandes\npara visualizar"
+        draw.multiline_text((preview_width // 2, preview_height // 2), 
+                           msg, fill='#ff0000', anchor="mm", align="center")
+    
+    # Linha tracejada na margem esquerda para fichário
+    if config['margin_left'] >= 2.5:  # Se margem >= 2.5cm
+        # Desenha furos de fichário
+        hole_y_positions = [
+            preview_height * 0.2,
+            preview_height * 0.5,
+            preview_height * 0.8
+        ]
+        hole_x = margin_left - 15
+        
+        for y_pos in hole_y_positions:
+            # Desenha círculo representando furo
+            draw.ellipse([hole_x - 5, y_pos - 5, hole_x + 5, y_pos + 5], 
+                        outline='#ff6666', width=2)
+    
+    return img
+
+
+def _font(size):
+    return ImageFont.load_default(size=max(1, round(size)))
+
+
+def _draw_preview_watermark(img, config, global_watermark, scale):
+    """Marca d'água girada 45° no centro, com a opacidade configurada (como no PDF)."""
+    watermark = config.get('watermark_text', '') or global_watermark
+    if not watermark:
+        return img
+    
+    layer = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    alpha = round(255 * config.get('watermark_opacity', 0.1))
+    center = (img.width / 2, img.height / 2)
+    ImageDraw.Draw(layer).text(center, watermark, font=_font(config.get('watermark_size', 40) * scale),
+                               fill=(0, 0, 0, alpha), anchor='ms')
+    layer = layer.rotate(45, center=center, resample=Image.Resampling.BILINEAR)
+    return Image.alpha_composite(img.convert('RGBA'), layer).convert('RGB')
+
+
+def render_sheet_preview(config, slides, thumbnails, global_page_num=1, settings=None, group_name='',
+                         preview_width=PREVIEW_WIDTH):
+    """
+    Compõe uma folha de saída com as miniaturas reais dos slides, usando a mesma
+    geometria e decoração da exportação. `slides` são as tuplas (pdf_index, page_index)
+    da folha e `thumbnails` mapeia cada tupla para a imagem (PIL ou bytes JPEG).
+    """
+    settings = ExportSettings.coerce(settings)
+    plan = LayoutPlan.for_sheet(config, global_page_num, settings.landscape_binder_mode)
+    page_width, page_height = plan.page_width, plan.page_height
+    scale = preview_width / page_width
+    
+    def to_pixels(x, y):
+        # Coordenadas do PDF (origem embaixo) para pixels (origem em cima)
+        return x * scale, (page_height - y) * scale
+    
+    img = Image.new('RGB', (preview_width, round(page_height * scale)), 'white')
+    img = _draw_preview_watermark(img, config, settings.global_watermark, scale)
+    draw = ImageDraw.Draw(img)
+    
+    # Cabeçalho, rodapé e numeração global
+    for text, x, y, size, gray, align in sheet_text_items(config, group_name, page_width, page_height,
+                                                           plan.margins[0], global_page_num,
+                                                           settings.global_page_numbers):
+        shade = round(255 * gray)
+        draw.text(to_pixels(x, y), text, font=_font(size * scale), fill=(shade, shade, shade),
+                  anchor='rs' if align == 'right' else 'ls')
+    
+    # Imagens orientadas dos slides da folha (None onde a miniatura não está disponível)
+    sources = []
+    for pdf_idx, page_idx in slides:
+        if pdf_idx == -1:
+            source = create_blank_page_image(lined=settings.blank_pages_lined)
+        else:
+            source = thumbnails.get((pdf_idx, page_idx))
+            if source is None:
+                sources.append(None)
+                continue
+            if isinstance(source, bytes):
+                source = Image.open(io.BytesIO(source))
+        sources.append(orient_slide_image(source.convert('RGB'), config['rotate_images'],
+                                          config['image_orientation']))
+    boxes = plan.fit([1 if source is None else source.width / source.height for source in sources])
+    
+    cells = plan.cell_rects(len(slides))
+    for (pdf_idx, page_idx), source, box, cell in zip(slides, sources, boxes, cells):
+        x_base, y_base, slide_width, slide_height = cell
+        
+        # Borda da célula (desenhada antes da imagem, como no PDF)
+        if config['show_borders']:
+            left, top = to_pixels(x_base, y_base + slide_height)
+            right, bottom = to_pixels(x_base + slide_width, y_base)
+            draw.rectangle([left, top, right, bottom], outline=(128, 128, 128),
+                           width=max(1, round(config['border_width'] * scale)))
+        
+        if source is None:
+            continue
+        
+        x_final, y_final, draw_width, draw_height = box
+        left, top = to_pixels(x_final, y_final + draw_height)
+        tile = source.resize((max(1, round(draw_width * scale)), max(1, round(draw_height * scale))),
+                             Image.Resampling.BILINEAR)
+        img.paste(tile, (round(left), round(top)))
+        
+        item = slide_number_item(config, pdf_idx, page_idx, x_base, y_base, slide_width, slide_height,
+                                 settings.pdf_names)
+        if item is not None:
+            number_text, x, y = item
+            draw.text(to_pixels(x, y), number_text, font=_font(config['number_size'] * scale),
+                      fill=(77, 77, 77), anchor='ls')
+    
+    return img
+
+
+def group_sheet_slides(pages, config, sheet_index):
+    """Tuplas (pdf_index, page_index) da folha `sheet_index` (base 0) de um grupo."""
+    slides_per_page = config['grid_cols'] * config['grid_rows']
+    return list(pages[sheet_index * slides_per_page:(sheet_index + 1) * slides_per_page])
+
+
+def sheet_preview_key(config, slides, global_page_num, settings, group_name, content_hashes,
+                      preview_width=PREVIEW_WIDTH):
+    """Hash de tudo o que determina o preview de uma folha (config completa, páginas e PDFs)."""
+    payload = json.dumps({
+        'config': config,
+        'slides': [list(slide) for slide in slides],
+        'page': global_page_num,
+        'settings': ExportSettings.coerce(settings).to_dict(),
+        'group': group_name,
+        'pdfs': content_hashes,
+        'date': date.today().isoformat(),  # {date} no cabeçalho/rodapé
+        'width': preview_width
+    }, sort_keys=True, default=str)
+    return ('sheet-preview', hashlib.sha256(payload.encode('utf-8')).hexdigest())
+
+
+def sheet_preview_png(cache, config, slides, sources, global_page_num=1, settings=None, group_name='',
+                      preview_width=PREVIEW_WIDTH):
+    """
+    Retorna o PNG do preview da folha, memoizado em `cache` (ex.: RenditionCache)
+    pelo hash da configuração. `sources` mapeia pdf_index -> LazyPdfPages, de onde
+    vêm as miniaturas (já em cache na maioria das vezes).
+    """
+    pdf_indices = sorted({pdf_idx for pdf_idx, _ in slides if pdf_idx != -1})
+    content_hashes = {idx: sources[idx].content_hash for idx in pdf_indices}
+    key = sheet_preview_key(config, slides, global_page_num, settings, group_name, content_hashes, preview_width)
+    data = cache.get(key)
+    if data is not None:
+        return data
+    
+    thumbnails = {}
+    for pdf_idx in pdf_indices:
+        indices = [page_idx for idx, page_idx in slides if idx == pdf_idx]
+        for page_idx, thumbnail in sources[pdf_idx].get_thumbnails(indices).items():
+            thumbnails[(pdf_idx, page_idx)] = thumbnail
+    
+    img = render_sheet_preview(config, slides, thumbnails, global_page_num, settings, group_name, preview_width)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', compress_level=1)
+    data = buffer.getvalue()
+    cache.put(key, data)
+    return data
@@ -0,0 +1,138 @@
+"""Índice de posse das páginas pelos grupos, atualizado a cada alteração de seleção."""
+
+
+class PageOwnership:
+    """
+    Mantém, para uma lista de grupos, o índice página -> grupos que a contêm e,
+    por grupo, o conjunto ordenado das suas páginas. Consultas como "em que outro
+    grupo está esta página?" ficam O(1) em vez de varrer as listas de todos os grupos.
+    
+    As alterações de páginas devem passar por `set_pages`, `add_group` e
+    `remove_group`, que atualizam o índice e a lista `group['pages']` (que continua
+    sendo a fonte usada pela exportação e pelo JSON). Páginas em branco não entram
+    no índice: podem se repetir e não pertencem a nenhum PDF.
+    """
+    
+    def __init__(self, groups):
+        self.groups = groups
+        self._owners = {}   # página -> lista de índices de grupo
+        self._members = []  # por grupo: dict ordenado página -> None
+        for group in groups:
+            self._members.append({})
+            self._index(len(self._members) - 1, group['pages'])
+    
+    def tracks(self, groups):
+        """Diz se o índice ainda corresponde a esta lista de grupos (mesmo objeto e tamanho)."""
+        return groups is self.groups and len(groups) == len(self._members)
+    
+    def _index(self, group_idx, pages):
+        members = self._members[group_idx]
+        for page in pages:
+            if page[0] == -1 or page in members:
+                continue
+            members[page] = None
+            self._owners.setdefault(page, []).append(group_idx)
+    
+    def _unindex(self, group_idx, pages):
+        members = self._members[group_idx]
+        for page in pages:
+            if page in members:
+                del members[page]
+                owners = self._owners[page]
+                owners.remove(group_idx)
+                if not owners:
+                    del self._owners[page]
+    
+    def owner(self, page, exclude=None):
+        """Primeiro grupo (índice) que contém a página, ignorando `exclude`; None se nenhum."""
+        for group_idx in self._owners.get(page, ()):
+            if group_idx != exclude:
+                return group_idx
+        return None
+    
+    def contains(self, group_idx, page):
+        return page in self._members[group_idx]
+    
+    def pages(self, group_idx):
+        """Páginas (sem as em branco) do grupo, na ordem de seleção."""
+        return list(self._members[group_idx])
+    
+    def available(self, pages, group_idx):
+        """Filtra as páginas que não pertencem a nenhum grupo além de `group_idx`."""
+        return [page for page in pages if self.owner(page, exclude=group_idx) is None]
+    
+    def unassigned(self, pages):
+        """Filtra as páginas que não pertencem a nenhum grupo."""
+        return [page for page in pages if page not in self._owners]
+    
+    def set_pages(self, group_idx, pages):
+        """Substitui as páginas do grupo, atualizando o índice só pelo que mudou."""
+        pages = list(pages)
+        new_members = {page: None for page in pages if page[0] != -1}
+        members = self._members[group_idx]
+        self._unindex(group_idx, [page for page in members if page not in new_members])
+        self._index(group_idx, [page for page in new_members if page not in members])
+        # Mantém a ordem nova no conjunto ordenado
+        self._members[group_idx] = new_members
+        self.groups[group_idx]['pages'] = pages
+    
+    def add_group(self, group):
+        """Acrescenta um grupo ao final da lista e indexa suas páginas."""
+        self.groups.append(group)
+        self._members.append({})
+        self._index(len(self._members) - 1, group['pages'])
+        return len(self.groups) - 1
+    
+    def remove_group(self, group_idx):
+        """Remove o grupo; os índices dos grupos seguintes diminuem em um."""
+        self._unindex(group_idx, list(self._members[group_idx]))
+        del self.groups[group_idx]
+        del self._members[group_idx]
+        for owners in self._owners.values():
+            for i, owner_idx in enumerate(owners):
+                if owner_idx > group_idx:
+                    owners[i] = owner_idx - 1
+
+
+def parse_page_ranges(text, page_count):
+    """
+    Converte um texto como "1-40, 55, 60-" nos índices (base 0) das páginas, em ordem
+    e sem repetição. "-10" vai da primeira até a 10 e "60-" vai até a última. Números
+    além de `page_count` são ignorados. Levanta ValueError se o texto for inválido.
+    """
+    indices = set()
+    for part in text.replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        
+        start_text, dash, end_text = part.partition('-')
+        try:
+            start = int(start_text) if start_text.strip() else 1
+            end = (int(end_text) if end_text.strip() else page_count) if dash else start
+        except ValueError:
+            raise ValueError(f"intervalo inválido: '{part}'") from None
+        if start < 1 or end < start:
+            raise ValueError(f"intervalo inválido: '{part}'")
+        
+        indices.update(range(start - 1, min(end, page_count)))
+    return sorted(indices)
+
+
+def duplicate_pages(sources):
+    """
+    Mapeia cada página que repete o conteúdo de uma página anterior (na ordem dos PDFs
+    e das páginas) para a primeira ocorrência: {(pdf, página): (pdf, página)}.
+    Fontes sem `page_hashes` (ex.: listas de imagens) são ignoradas.
+    """
+    first_seen = {}
+    duplicates = {}
+    for pdf_idx, source in sources.items():
+        page_hashes = getattr(source, 'page_hashes', None)
+        if page_hashes is None:
+            continue
+        for page_idx, page_hash in enumerate(page_hashes()):
+            first = first_seen.setdefault(page_hash, (pdf_idx, page_idx))
+            if first != (pdf_idx, page_idx):
+                duplicates[(pdf_idx, page_idx)] = first
+    return duplicates
@@ -0,0 +1,31 @@
+import gc
+import os
+
+from slideoptimizer.job import OutputFile
+
+
+def test_output_file_read_e_size(tmp_path):
+    output = OutputFile(directory=tmp_path)
+    assert os.path.dirname(output.path) == str(tmp_path)
+    assert output.size == 0
+    with open(output.path, 'wb') as f:
+        f.write(b'%PDF-1.4')
+    assert output.size == 8
+    assert output.read() == b'%PDF-1.4'
+
+
+def test_output_file_discard(tmp_path):
+    output = OutputFile(directory=tmp_path)
+    output.discard()
+    assert not os.path.exists(output.path)
+    assert output.size == 0
+    # Descartar de novo não falha
+    output.discard()
+
+
+def test_output_file_apagado_ao_ser_coletado(tmp_path):
+    output = OutputFile(directory=tmp_path)
+    path = output.path
+    del output
+    gc.collect()
+    assert not os.path.exists(path)
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import pytest
+
+from slideoptimizer.jobqueue import JobQueue
+
+
+@dataclass
+class FakeJob:
+    """Job que avança uma folha por vez enquanto `release` não é sinalizado."""
+    output_path: str = ''
+    mode: str = 'raster'
+    release: threading.Event = field(default_factory=threading.Event)
+    started: threading.Event = field(default_factory=threading.Event)
+    total: int = 3
+    
+    def run(self, sources, on_progress=None, instrumentation=None):
+        self.started.set()
+        for done in range(self.total):
+            on_progress(done, self.total)
+            self.release.wait(0.01)
+        on_progress(self.total, self.total)
+        if not self.release.wait(5):
+            raise RuntimeError("job não foi liberado")
+        with open(self.output_path, 'wb') as f:
+            f.write(b'%PDF')
+
+
+def wait_finished(queue, job_id, timeout=5):
+    limit = time.time() + timeout
+    while time.time() < limit:
+        status = queue.status(job_id)
+        if status.finished:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} não terminou")
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(max_concurrent=1)
+    yield queue
+    queue.shutdown()
+
+
+def test_job_concluido(queue):
+    job = FakeJob()
+    job.release.set()
+    job_id = queue.submit(job, {})
+    status = wait_finished(queue, job_id)
+    assert status.state == 'done'
+    assert (status.done, status.total) == (3, 3)
+    assert status.output.read() == b'%PDF'
+
+
+def test_cancelar_job_em_execucao(queue):
+    job = FakeJob(total=1000)
+    job_id = queue.submit(job, {})
+    assert job.started.wait(5)
+    queue.cancel(job_id)
+    status = wait_finished(queue, job_id)
+    assert status.state == 'cancelled'
+    assert status.output is None
+
+
+def test_cancelar_job_na_fila(queue):
+    running = FakeJob()
+    queued = FakeJob()
+    running_id = queue.submit(running, {})
+    queued_id = queue.submit(queued, {})
+    assert running.started.wait(5)
+    assert queue.status(queued_id).position == 0
+    
+    queue.cancel(queued_id)
+    status = queue.status(queued_id)
+    assert status.state == 'cancelled'
+    assert status.output is None
+    running.release.set()
+    assert wait_finished(queue, running_id).state == 'done'
+    assert not queued.started.is_set()
+
+
+def test_forget_apaga_o_pdf(queue):
+    job = FakeJob()
+    job.release.set()
+    job_id = queue.submit(job, {})
+    path = wait_finished(queue, job_id).output.path
+    assert os.path.exists(path)
+    queue.forget(job_id)
+    assert queue.status(job_id) is None
+    assert not os.path.exists(path)
+
+
+def test_jobs_terminados_expiram():
+    queue = JobQueue(max_concurrent=1, keep_finished=0)
+    try:
+        job = FakeJob()
+        job.release.set()
+        job_id = queue.submit(job, {})
+        path = wait_finished(queue, job_id).output.path
+        
+        # A expiração acontece na próxima submissão
+        other = FakeJob()
+        other.release.set()
+        other_id = queue.submit(other, {})
+        assert queue.status(job_id) is None
+        assert not os.path.exists(path)
+        assert wait_finished(queue, other_id).state == 'done'
+    finally:
+        queue.shutdown()
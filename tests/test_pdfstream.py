@@ -0,0 +1,39 @@
+import io
+
+from pypdf import PdfReader
+from reportlab.pdfgen import canvas
+
+from slideoptimizer.pdfstream import StreamingPdfWriter
+
+
+def make_pdf(texts):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(200, 100))
+    for text in texts:
+        c.drawString(10, 50, text)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def test_junta_pdfs_parciais():
+    output = io.BytesIO()
+    writer = StreamingPdfWriter(output)
+    for texts in (['um', 'dois'], ['tres']):
+        writer.append(make_pdf(texts))
+    writer.finish()
+    assert writer.size == len(output.getvalue())
+    
+    reader = PdfReader(output)
+    assert [page.extract_text().strip() for page in reader.pages] == ['um', 'dois', 'tres']
+    assert reader.metadata is not None
+    # A fonte (sem referências) é repetida nos PDFs parciais, mas gravada uma vez só
+    assert reader.pages[0]['/Resources']['/Font'] == reader.pages[2]['/Resources']['/Font']
+
+
+def test_grava_no_caminho(tmp_path):
+    path = tmp_path / 'saida.pdf'
+    with StreamingPdfWriter(path) as writer:
+        writer.append(make_pdf(['a']))
+        writer.finish()
+    assert len(PdfReader(path).pages) == 1
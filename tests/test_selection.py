@@ -0,0 +1,72 @@
+import pytest
+
+from slideoptimizer.selection import PageOwnership, parse_page_ranges
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1-3, 5', [0, 1, 2, 4]),
+    ('5; 1-2', [0, 1, 4]),
+    ('-2', [0, 1]),
+    ('8-', [7, 8, 9]),
+    ('3, 3, 2-4', [1, 2, 3]),
+    ('9-40', [8, 9]),
+    ('11', []),
+    (' , ', []),
+])
+def test_parse_page_ranges(text, expected):
+    assert parse_page_ranges(text, 10) == expected
+
+
+@pytest.mark.parametrize('text', ['a', '0', '4-2', '1-b', '1--3'])
+def test_parse_page_ranges_invalido(text):
+    with pytest.raises(ValueError):
+        parse_page_ranges(text, 10)
+
+
+def make_groups():
+    return [
+        {'name': 'A', 'pages': [(0, 0), (0, 1), (-1, 0)]},
+        {'name': 'B', 'pages': [(0, 1), (0, 2)]},
+    ]
+
+
+def test_ownership_indexa_paginas():
+    ownership = PageOwnership(make_groups())
+    assert ownership.owner((0, 1)) == 0
+    assert ownership.owner((0, 1), exclude=0) == 1
+    assert ownership.owner((0, 5)) is None
+    # Páginas em branco não pertencem a nenhum grupo
+    assert ownership.owner((-1, 0)) is None
+    assert ownership.pages(0) == [(0, 0), (0, 1)]
+    assert ownership.available([(0, 0), (0, 2), (0, 3)], 1) == [(0, 2), (0, 3)]
+    assert ownership.unassigned([(0, 0), (0, 3)]) == [(0, 3)]
+
+
+def test_ownership_set_pages():
+    groups = make_groups()
+    ownership = PageOwnership(groups)
+    ownership.set_pages(0, [(0, 3), (-1, 0), (0, 0)])
+    assert groups[0]['pages'] == [(0, 3), (-1, 0), (0, 0)]
+    assert ownership.pages(0) == [(0, 3), (0, 0)]
+    assert ownership.owner((0, 1)) == 1
+    assert ownership.contains(0, (0, 3))
+    assert not ownership.contains(0, (0, 1))
+
+
+def test_ownership_add_e_remove_group():
+    groups = make_groups()
+    ownership = PageOwnership(groups)
+    new_idx = ownership.add_group({'name': 'C', 'pages': [(0, 2), (0, 4)]})
+    assert new_idx == 2
+    assert ownership.tracks(groups)
+    assert ownership.owner((0, 2)) == 1
+    assert ownership.owner((0, 2), exclude=1) == 2
+    
+    ownership.remove_group(0)
+    assert [group['name'] for group in groups] == ['B', 'C']
+    assert ownership.tracks(groups)
+    assert ownership.owner((0, 0)) is None
+    # Os índices dos grupos seguintes diminuem em um
+    assert ownership.owner((0, 1)) == 0
+    assert ownership.owner((0, 4)) == 1
+    assert not ownership.tracks(make_groups())